@@ -1,6 +1,8 @@
 import os
-import json
-import aiohttp
+import time
+import asyncio
+import asyncpg
+import orjson
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 import logging
@@ -8,51 +10,124 @@ import logging
 logger = logging.getLogger(__name__)
 
 class NeonDatabase:
+    # Grading N submissions for one assignment re-reads the same rubric N
+    # times; a short TTL keeps repeat fetches in-process
+    ASSIGNMENT_CACHE_TTL = 60
+
     def __init__(self):
-        self.base_url = "http://localhost:5000"  # CHECKmate LMS API
-        self.session = None
+        self.dsn = os.environ.get("DATABASE_URL", "postgresql://localhost:5432/checkmate")
+        self.pool = None
+        self._assignment_cache: Dict[str, Any] = {}
+        self._assignment_locks: Dict[str, asyncio.Lock] = {}
     
     async def connect(self):
-        """Connect to CHECKmate LMS API"""
+        """Connect directly to the Neon Postgres database"""
         try:
-            self.session = aiohttp.ClientSession()
-            # Test connection
-            async with self.session.get(f"{self.base_url}/api/health") as response:
-                if response.status == 200:
-                    logger.info("Connected to CHECKmate LMS API successfully")
-                else:
-                    logger.warning("CHECKmate LMS API not responding properly")
+            # Direct asyncpg pool: the binary wire protocol plus the prepared-
+            # statement cache skips the JSON+HTTP hop through the LMS API entirely
+            self.pool = await asyncpg.create_pool(
+                dsn=self.dsn,
+                min_size=4,
+                max_size=20,
+                statement_cache_size=512
+            )
+            logger.info("Connected to Neon Postgres successfully")
         except Exception as e:
-            logger.error(f"Failed to connect to CHECKmate LMS API: {e}")
+            logger.error(f"Failed to connect to database: {e}")
             # Continue without database for now
     
     async def close(self):
-        """Close API session"""
-        if self.session:
-            await self.session.close()
-            logger.info("API session closed")
+        """Close database pool"""
+        if self.pool:
+            await self.pool.close()
+            logger.info("Database pool closed")
+    
+    def _parse_rubric(self, assignment: Dict[str, Any]) -> Dict[str, Any]:
+        """Parse rubric column if it is stored as a JSON string"""
+        if assignment.get('rubric') and isinstance(assignment['rubric'], str):
+            try:
+                assignment['rubric'] = orjson.loads(assignment['rubric'])
+            except orjson.JSONDecodeError:
+                assignment['rubric'] = {}
+        return assignment
+    
+    def _cached_assignment(self, assignment_id: str) -> Optional[Dict[str, Any]]:
+        """Return the cached assignment if it is still fresh"""
+        cached = self._assignment_cache.get(assignment_id)
+        if cached and time.monotonic() - cached[0] < self.ASSIGNMENT_CACHE_TTL:
+            return cached[1]
+        return None
     
     async def get_assignment(self, assignment_id: str) -> Optional[Dict[str, Any]]:
-        """Get assignment details from CHECKmate LMS API"""
-        try:
-            if not self.session:
+        """Get assignment details from database (cached with a short TTL)"""
+        cached = self._cached_assignment(assignment_id)
+        if cached is not None:
+            return cached
+        
+        # Per-key lock so concurrent graders don't stampede the same fetch
+        lock = self._assignment_locks.setdefault(assignment_id, asyncio.Lock())
+        async with lock:
+            cached = self._cached_assignment(assignment_id)
+            if cached is not None:
+                return cached
+            
+            try:
+                async with self.pool.acquire() as conn:
+                    query = """
+                    SELECT id, title, description, rubric
+                    FROM assignments 
+                    WHERE id = $1
+                    """
+                    row = await conn.fetchrow(query, assignment_id)
+                    
+                    if row:
+                        assignment = self._parse_rubric(dict(row))
+                        self._assignment_cache[assignment_id] = (time.monotonic(), assignment)
+                        return assignment
+                    return None
+            except Exception as e:
+                logger.error(f"Error fetching assignment {assignment_id}: {e}")
                 return None
+    
+    async def get_grading_context(self, assignment_id: str, submission_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Get assignment, rubric and submission over a single pooled connection"""
+        try:
+            # A fresh cached assignment skips the assignments query - and
+            # with no submission to fetch, the pool round-trip entirely
+            assignment = self._cached_assignment(assignment_id)
+            if assignment is not None and not submission_id:
+                return {'assignment': assignment, 'submission': None}
+
+            async with self.pool.acquire() as conn:
+                if assignment is None:
+                    query = """
+                    SELECT id, title, description, rubric
+                    FROM assignments
+                    WHERE id = $1
+                    """
+                    row = await conn.fetchrow(query, assignment_id)
+                    if not row:
+                        return None
+
+                    assignment = self._parse_rubric(dict(row))
+                    self._assignment_cache[assignment_id] = (time.monotonic(), assignment)
+                context = {'assignment': assignment, 'submission': None}
+
+                if submission_id:
+                    sub_query = """
+                    SELECT id, student_id, assignment_id, content, submitted_at
+                    FROM submissions 
+                    WHERE id = $1
+                    """
+                    sub_row = await conn.fetchrow(sub_query, submission_id)
+                    if sub_row:
+                        context['submission'] = dict(sub_row)
                 
-            async with self.session.get(f"{self.base_url}/api/assignments/{assignment_id}") as response:
-                if response.status == 200:
-                    assignment = await response.json()
-                    # Parse rubric if it's JSON
-                    if assignment.get('rubric') and isinstance(assignment['rubric'], str):
-                        try:
-                            assignment['rubric'] = json.loads(assignment['rubric'])
-                        except json.JSONDecodeError:
-                            assignment['rubric'] = {}
-                    return assignment
-                return None
+                return context
         except Exception as e:
-            logger.error(f"Error fetching assignment {assignment_id}: {e}")
+            logger.error(f"Error fetching grading context for assignment {assignment_id}: {e}")
             return None
-    
+
     async def get_submission(self, submission_id: str) -> Optional[Dict[str, Any]]:
         """Get submission details from database"""
         try:
@@ -70,8 +145,8 @@ class NeonDatabase:
                     # Parse AI results if they exist
                     if submission.get('ai_results') and isinstance(submission['ai_results'], str):
                         try:
-                            submission['ai_results'] = json.loads(submission['ai_results'])
-                        except json.JSONDecodeError:
+                            submission['ai_results'] = orjson.loads(submission['ai_results'])
+                        except orjson.JSONDecodeError:
                             submission['ai_results'] = None
                     return submission
                 return None
@@ -90,13 +165,60 @@ class NeonDatabase:
                     updated_at = NOW()
                 WHERE id = $1
                 """
-                await conn.execute(query, submission_id, json.dumps(ai_results))
+                await conn.execute(query, submission_id, orjson.dumps(ai_results).decode())
                 logger.info(f"Saved AI results for submission {submission_id}")
                 return True
         except Exception as e:
             logger.error(f"Error saving AI results for submission {submission_id}: {e}")
             return False
     
+    async def save_grading_bundle(self, submission_id: str, ai_results: Dict[str, Any], plag_report: Dict[str, Any]) -> bool:
+        """Save AI results and the plagiarism report in one transaction.
+
+        Both writes target the same submission, so sharing a single acquired
+        connection pipelines them instead of paying two pool round-trips.
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                await self._ensure_plagiarism_table_exists(conn)
+                async with conn.transaction():
+                    await conn.execute(
+                        """
+                        UPDATE submissions
+                        SET ai_processed = true,
+                            ai_results = $2,
+                            updated_at = NOW()
+                        WHERE id = $1
+                        """,
+                        submission_id, orjson.dumps(ai_results).decode()
+                    )
+                    await conn.execute(
+                        """
+                        INSERT INTO plagiarism_reports (submission_id, similarity_score,
+                                                      is_suspicious, suspicious_segments,
+                                                      matched_sources, analysis, created_at)
+                        VALUES ($1, $2, $3, $4, $5, $6, NOW())
+                        ON CONFLICT (submission_id) DO UPDATE SET
+                            similarity_score = EXCLUDED.similarity_score,
+                            is_suspicious = EXCLUDED.is_suspicious,
+                            suspicious_segments = EXCLUDED.suspicious_segments,
+                            matched_sources = EXCLUDED.matched_sources,
+                            analysis = EXCLUDED.analysis,
+                            updated_at = NOW()
+                        """,
+                        submission_id,
+                        plag_report.get('similarity_score', 0),
+                        plag_report.get('is_suspicious', False),
+                        orjson.dumps(plag_report.get('suspicious_segments', [])).decode(),
+                        orjson.dumps(plag_report.get('matched_sources', [])).decode(),
+                        plag_report.get('analysis', '')
+                    )
+                logger.info(f"Saved grading bundle for submission {submission_id}")
+                return True
+        except Exception as e:
+            logger.error(f"Error saving grading bundle for submission {submission_id}: {e}")
+            return False
+
     async def get_student_submissions(self, student_id: str) -> List[Dict[str, Any]]:
         """Get all submissions by a student for plagiarism checking"""
         try:
@@ -130,6 +252,27 @@ class NeonDatabase:
             logger.error(f"Error fetching submissions for assignment {assignment_id}: {e}")
             return []
     
+    async def iter_submissions_for_assignment(self, assignment_id: str):
+        """Stream submissions for an assignment one row at a time.
+
+        Unlike get_all_submissions_for_assignment this reads from a server-side
+        cursor, so peak memory stays at roughly one row of essay content even
+        when an assignment has hundreds of submissions.
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                query = """
+                SELECT id, student_id, content, submitted_at
+                FROM submissions
+                WHERE assignment_id = $1 AND content IS NOT NULL
+                ORDER BY submitted_at DESC
+                """
+                async with conn.transaction():
+                    async for row in conn.cursor(query, assignment_id, prefetch=50):
+                        yield dict(row)
+        except Exception as e:
+            logger.error(f"Error streaming submissions for assignment {assignment_id}: {e}")
+
     async def create_plagiarism_report(self, submission_id: str, report_data: Dict[str, Any]) -> bool:
         """Save plagiarism detection results"""
         try:
@@ -155,8 +298,8 @@ class NeonDatabase:
                     submission_id,
                     report_data.get('similarity_score', 0),
                     report_data.get('is_suspicious', False),
-                    json.dumps(report_data.get('suspicious_segments', [])),
-                    json.dumps(report_data.get('matched_sources', [])),
+                    orjson.dumps(report_data.get('suspicious_segments', [])).decode(),
+                    orjson.dumps(report_data.get('matched_sources', [])).decode(),
                     report_data.get('analysis', '')
                 )
                 logger.info(f"Saved plagiarism report for submission {submission_id}")
@@ -165,6 +308,63 @@ class NeonDatabase:
             logger.error(f"Error saving plagiarism report for submission {submission_id}: {e}")
             return False
     
+    async def create_plagiarism_reports_bulk(self, reports: List[Dict[str, Any]]) -> bool:
+        """Save many plagiarism reports in one round-trip.
+
+        Rows are COPYed into a temp staging table and upserted with a single
+        INSERT ... ON CONFLICT, instead of one upsert round-trip per report.
+        """
+        if not reports:
+            return True
+
+        try:
+            records = [
+                (
+                    report['submission_id'],
+                    report.get('similarity_score', 0),
+                    report.get('is_suspicious', False),
+                    orjson.dumps(report.get('suspicious_segments', [])).decode(),
+                    orjson.dumps(report.get('matched_sources', [])).decode(),
+                    report.get('analysis', '')
+                )
+                for report in reports
+            ]
+
+            async with self.pool.acquire() as conn:
+                await self._ensure_plagiarism_table_exists(conn)
+                async with conn.transaction():
+                    await conn.execute("""
+                        CREATE TEMP TABLE staging_plagiarism_reports (
+                            submission_id VARCHAR NOT NULL,
+                            similarity_score DECIMAL(5,2),
+                            is_suspicious BOOLEAN,
+                            suspicious_segments TEXT,
+                            matched_sources TEXT,
+                            analysis TEXT
+                        ) ON COMMIT DROP
+                    """)
+                    await conn.copy_records_to_table('staging_plagiarism_reports', records=records)
+                    await conn.execute("""
+                        INSERT INTO plagiarism_reports (submission_id, similarity_score,
+                                                      is_suspicious, suspicious_segments,
+                                                      matched_sources, analysis, created_at)
+                        SELECT submission_id, similarity_score, is_suspicious,
+                               suspicious_segments, matched_sources, analysis, NOW()
+                        FROM staging_plagiarism_reports
+                        ON CONFLICT (submission_id) DO UPDATE SET
+                            similarity_score = EXCLUDED.similarity_score,
+                            is_suspicious = EXCLUDED.is_suspicious,
+                            suspicious_segments = EXCLUDED.suspicious_segments,
+                            matched_sources = EXCLUDED.matched_sources,
+                            analysis = EXCLUDED.analysis,
+                            updated_at = NOW()
+                    """)
+                logger.info(f"Saved {len(records)} plagiarism reports in bulk")
+                return True
+        except Exception as e:
+            logger.error(f"Error bulk-saving plagiarism reports: {e}")
+            return False
+
     async def _ensure_plagiarism_table_exists(self, conn):
         """Ensure plagiarism_reports table exists"""
         create_table_query = """
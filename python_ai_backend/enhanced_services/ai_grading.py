@@ -1,7 +1,9 @@
 import re
+import asyncio
+import numpy as np
+from dataclasses import dataclass
 from typing import Dict, List, Any, Tuple
 from collections import Counter
-from textstat import flesch_reading_ease, flesch_kincaid_grade, automated_readability_index
 import logging
 from ..database import db
 
@@ -14,25 +16,94 @@ TRANSITION_WORDS = {
     'sequence': ['firstly', 'secondly', 'finally', 'subsequently', 'meanwhile']
 }
 
-ACADEMIC_VOCABULARY = [
+ACADEMIC_VOCABULARY = frozenset({
     'analyze', 'evaluate', 'demonstrate', 'illustrate', 'synthesize',
     'interpret', 'examine', 'investigate', 'emphasize', 'significant'
-]
+})
+
+# Precompiled patterns - compiling once at import avoids re-compilation
+# (and re-cache lookups) on every scoring call
+_WORD_RE = re.compile(r'\b\w+\b')
+_SENT_SPLIT_RE = re.compile(r'[.!?]+')
+_END_PUNCT_RE = re.compile(r'[.!?]$')
+_REPEAT_RE = re.compile(r'\b(\w+)\s+\1\b', re.IGNORECASE)
+_PASSIVE_RE = re.compile(r'\b(is|are|was|were|been|be)\s+\w+ed\b', re.IGNORECASE)
+_CITATION_RE = re.compile(r'\([^)]*\d{4}[^)]*\)|\[\d+\]')
+_QUESTION_RE = re.compile(r'\?')
+_VOWEL_GROUP_RE = re.compile(r'[aeiouy]+')
+# One alternation covering all reasoning indicators so the essay is scanned
+# once instead of once per pattern group
+_REASONING_COMBINED_RE = re.compile(
+    r'\b(?:because|since|therefore|thus|hence|consequently'
+    r'|for example|for instance|such as|including'
+    r'|according to|research shows|studies indicate'
+    r'|in contrast|on the other hand|alternatively)\b',
+    re.IGNORECASE
+)
+
+@dataclass
+class DocFeatures:
+    """Tokenization computed once per document and shared by every scoring pass"""
+    text: str
+    words: List[str]
+    words_lower: List[str]
+    sentences: List[str]
+    paragraphs: List[str]
+    word_counter: Counter
+    char_count: int
+
+def extract_doc_features(text: str) -> DocFeatures:
+    """Tokenize the document a single time instead of once per score function"""
+    words = _WORD_RE.findall(text)
+    words_lower = [word.lower() for word in words]
+    return DocFeatures(
+        text=text,
+        words=words,
+        words_lower=words_lower,
+        sentences=[s.strip() for s in _SENT_SPLIT_RE.split(text) if s.strip()],
+        paragraphs=[p for p in text.split('\n\n') if p.strip()],
+        word_counter=Counter(words_lower),
+        char_count=len(text)
+    )
+
+def _count_syllables(word: str) -> int:
+    """Approximate syllable count as the number of vowel groups"""
+    return max(1, len(_VOWEL_GROUP_RE.findall(word)))
+
+def _flesch_metrics(features: DocFeatures) -> Tuple[float, float]:
+    """Compute Flesch reading ease and Flesch-Kincaid grade level.
+
+    Works directly off the feature bundle's token counts, so the document is
+    not re-tokenized the way textstat would internally.
+    """
+    word_count = len(features.words)
+    if word_count == 0:
+        return 0.0, 0.0
+
+    sentence_count = max(len(features.sentences), 1)
+    syllables = sum(_count_syllables(word) * count
+                    for word, count in features.word_counter.items())
+    words_per_sentence = word_count / sentence_count
+    syllables_per_word = syllables / word_count
+
+    reading_ease = 206.835 - 1.015 * words_per_sentence - 84.6 * syllables_per_word
+    grade_level = 0.39 * words_per_sentence + 11.8 * syllables_per_word - 15.59
+    return reading_ease, grade_level
 
 def count_words(text: str) -> int:
     """Count words in text with improved accuracy"""
-    words = re.findall(r'\b\w+\b', text)
-    return len(words)
+    # finditer counts matches without materializing a list of every word
+    return sum(1 for _ in _WORD_RE.finditer(text))
 
 def count_sentences(text: str) -> int:
     """Count sentences accurately"""
-    sentences = re.split(r'[.!?]+', text)
+    sentences = _SENT_SPLIT_RE.split(text)
     return len([s for s in sentences if s.strip() and len(s.split()) > 2])
 
-def analyze_vocabulary_complexity(text: str) -> Dict[str, Any]:
+def analyze_vocabulary_complexity(features: DocFeatures) -> Dict[str, Any]:
     """Analyze vocabulary sophistication"""
-    words = re.findall(r'\b\w+\b', text.lower())
-    
+    words = features.words_lower
+
     if not words:
         return {
             "complexity_score": 0,
@@ -41,11 +112,19 @@ def analyze_vocabulary_complexity(text: str) -> Dict[str, Any]:
             "unique_words_ratio": 0
         }
     
-    avg_word_length = sum(len(word) for word in words) / len(words)
-    academic_word_count = sum(1 for word in words if word in ACADEMIC_VOCABULARY)
-    unique_words = set(words)
-    unique_ratio = len(unique_words) / len(words)
-    long_words = sum(1 for word in words if len(word) > 6)
+    # One pass over the counter (O(unique words)) instead of three passes
+    # over the full token list
+    total_length = 0
+    long_words = 0
+    for word, count in features.word_counter.items():
+        word_length = len(word)
+        total_length += word_length * count
+        if word_length > 6:
+            long_words += count
+
+    avg_word_length = total_length / len(words)
+    academic_word_count = sum(features.word_counter[word] for word in ACADEMIC_VOCABULARY)
+    unique_ratio = len(features.word_counter) / len(words)
     complexity_score = ((long_words / len(words)) * 0.4 + 
                        unique_ratio * 0.4 + 
                        (academic_word_count / max(len(words), 1)) * 0.2) * 100
@@ -58,25 +137,25 @@ def analyze_vocabulary_complexity(text: str) -> Dict[str, Any]:
         "long_words_count": long_words
     }
 
-def calculate_content_score(text: str, min_words: int = 100) -> Dict[str, Any]:
+def calculate_content_score(features: DocFeatures, min_words: int = 100, readability: float = None) -> Dict[str, Any]:
     """Enhanced content quality evaluation"""
-    word_count = count_words(text)
-    
+    word_count = len(features.words)
+
     if word_count < min_words:
         length_score = (word_count / min_words) * 0.5
     elif word_count < min_words * 1.5:
         length_score = 0.5 + ((word_count - min_words) / (min_words * 0.5)) * 0.3
     else:
         length_score = 0.8 + min((word_count - min_words * 1.5) / (min_words * 2), 0.2)
-    
-    vocab_analysis = analyze_vocabulary_complexity(text)
+
+    vocab_analysis = analyze_vocabulary_complexity(features)
     vocab_score = vocab_analysis["complexity_score"] / 100
-    
-    try:
-        readability = flesch_reading_ease(text)
-        readability_score = min(max((readability - 30) / 70, 0), 1)   
-    except:
-        readability_score = 0.5
+
+    # Caller can pass a precomputed Flesch score so the syllable pass only
+    # runs once per grading run
+    if readability is None:
+        readability = _flesch_metrics(features)[0]
+    readability_score = min(max((readability - 30) / 70, 0), 1)
     
     overall_score = (
         length_score * 0.4 + 
@@ -103,52 +182,67 @@ def calculate_content_score(text: str, min_words: int = 100) -> Dict[str, Any]:
         "feedback": " ".join(feedback) if feedback else "Good content quality with strong development."
     }
 
-def calculate_grammar_score(text: str) -> Dict[str, Any]:
+def _grammar_score_core(has_punct: bool, repeated: int, sent_count: int,
+                        passive: int, long_sents: int, fragments: int,
+                        cap_ratio: float) -> int:
+    """Pure-arithmetic grammar kernel over precomputed counts.
+
+    Kept free of string and regex work so it stays trivially cheap and could
+    be compiled down further if profiling ever warrants it.
+    """
+    score = 90
+    if not has_punct:
+        score -= 10
+    if repeated > 0:
+        score -= min(repeated * 5, 20)
+    if sent_count < 3:
+        score -= 15
+    if passive > sent_count * 0.3:
+        score -= 10
+    if long_sents > 2:
+        score -= 5
+    if fragments > 1:
+        score -= 10
+    if cap_ratio < 0.9:
+        score -= 5
+    return max(score, 0)
+
+def calculate_grammar_score(features: DocFeatures) -> Dict[str, Any]:
     """Enhanced grammar evaluation"""
-    sentences = [s.strip() for s in re.split(r'[.!?]+', text) if s.strip()]
+    sentences = features.sentences
     sentence_count = len(sentences)
-    
-    has_proper_punctuation = bool(re.search(r'[.!?]$', text.strip()))
-    repeated_words = len(re.findall(r'\b(\w+)\s+\1\b', text, re.IGNORECASE))
-    passive_indicators = len(re.findall(r'\b(is|are|was|were|been|be)\s+\w+ed\b', text, re.IGNORECASE))
-    long_sentences = sum(1 for s in sentences if len(s.split()) > 30)
-    fragments = sum(1 for s in sentences if len(s.split()) < 5)
+
+    has_proper_punctuation = bool(_END_PUNCT_RE.search(features.text.strip()))
+    repeated_words = len(_REPEAT_RE.findall(features.text))
+    passive_indicators = len(_PASSIVE_RE.findall(features.text))
+    # Single int32 vector of sentence word counts; the threshold filters
+    # become C-level reductions instead of per-sentence Python loops
+    sent_wc = np.fromiter((len(s.split()) for s in sentences), dtype=np.int32, count=sentence_count)
+    long_sentences = int((sent_wc > 30).sum())
+    fragments = int((sent_wc < 5).sum())
     proper_capitalization = sum(1 for s in sentences if s[0].isupper()) / max(sentence_count, 1)
-    
-    score = 90 
+
+    score = _grammar_score_core(
+        has_proper_punctuation, repeated_words, sentence_count,
+        passive_indicators, long_sentences, fragments, proper_capitalization
+    )
+
     feedback = []
-    
     if not has_proper_punctuation:
-        score -= 10
         feedback.append("Missing proper ending punctuation.")
-    
     if repeated_words > 0:
-        deduction = min(repeated_words * 5, 20)
-        score -= deduction
         feedback.append(f"Found {repeated_words} repeated words.")
-    
     if sentence_count < 3:
-        score -= 15
         feedback.append("Too few sentences. Expand your ideas.")
-    
     if passive_indicators > sentence_count * 0.3:
-        score -= 10
         feedback.append("Excessive passive voice. Use more active constructions.")
-    
     if long_sentences > 2:
-        score -= 5
         feedback.append("Some sentences are too long. Break them up.")
-    
     if fragments > 1:
-        score -= 10
         feedback.append("Sentence fragments detected. Ensure complete sentences.")
-    
     if proper_capitalization < 0.9:
-        score -= 5
         feedback.append("Check sentence capitalization.")
-    
-    score = max(score, 0)
-    
+
     if score >= 85:
         feedback.insert(0, "Strong grammar and style.")
     
@@ -157,11 +251,11 @@ def calculate_grammar_score(text: str) -> Dict[str, Any]:
         "feedback": " ".join(feedback) if feedback else "Grammar and style are excellent."
     }
 
-def calculate_structure_score(text: str) -> Dict[str, Any]:
+def calculate_structure_score(features: DocFeatures) -> Dict[str, Any]:
     """Enhanced structure evaluation"""
-    paragraphs = [p for p in text.split('\n\n') if p.strip()]
-    sentences = [s.strip() for s in re.split(r'[.!?]+', text) if s.strip()]
-    
+    paragraphs = features.paragraphs
+    sentences = features.sentences
+
     if not paragraphs or not sentences:
         return {
             "paragraph_count": 0,
@@ -172,15 +266,15 @@ def calculate_structure_score(text: str) -> Dict[str, Any]:
             "structure_balance": 0
         }
     
-    avg_paragraph_length = sum(len(p.split()) for p in paragraphs) / len(paragraphs)
-    avg_sentence_length = count_words(text) / len(sentences)
-    has_introduction = len(paragraphs) > 0 and len(paragraphs[0].split()) > 20
-    has_conclusion = len(paragraphs) > 1 and len(paragraphs[-1].split()) > 15
-    
+    # Split each paragraph exactly once; every metric below reuses the counts
+    paragraph_lengths = np.fromiter((len(p.split()) for p in paragraphs), dtype=np.int32, count=len(paragraphs))
+    avg_paragraph_length = float(paragraph_lengths.mean())
+    avg_sentence_length = len(features.words) / len(sentences)
+    has_introduction = paragraph_lengths[0] > 20
+    has_conclusion = len(paragraphs) > 1 and paragraph_lengths[-1] > 15
+
     if len(paragraphs) > 1:
-        paragraph_lengths = [len(p.split()) for p in paragraphs]
-        avg_len = sum(paragraph_lengths) / len(paragraph_lengths)
-        variance = sum((x - avg_len) ** 2 for x in paragraph_lengths) / len(paragraph_lengths)
+        variance = float(paragraph_lengths.var())
         structure_balance = max(0, 100 - variance)
     else:
         structure_balance = 50
@@ -226,23 +320,13 @@ def calculate_structure_score(text: str) -> Dict[str, Any]:
         "feedback": " ".join(feedback) if feedback else "Excellent structure and organization."
     }
 
-def analyze_argument_quality(text: str) -> Dict[str, Any]:
+def analyze_argument_quality(features: DocFeatures) -> Dict[str, Any]:
     """Analyze argumentation and critical thinking"""
-    reasoning_patterns = [
-        r'\b(because|since|therefore|thus|hence|consequently)\b',
-        r'\b(for example|for instance|such as|including)\b',
-        r'\b(according to|research shows|studies indicate)\b',
-        r'\b(in contrast|on the other hand|alternatively)\b'
-    ]
-    
-    reasoning_indicators = sum(
-        len(re.findall(pattern, text, re.IGNORECASE))
-        for pattern in reasoning_patterns
-    )
-    
-    citations = len(re.findall(r'\([^)]*\d{4}[^)]*\)|\[\d+\]', text))
-    questions = len(re.findall(r'\?', text))
-    sentence_count = count_sentences(text)
+    reasoning_indicators = sum(1 for _ in _REASONING_COMBINED_RE.finditer(features.text))
+
+    citations = len(_CITATION_RE.findall(features.text))
+    questions = len(_QUESTION_RE.findall(features.text))
+    sentence_count = sum(1 for s in features.sentences if len(s.split()) > 2)
     reasoning_density = reasoning_indicators / max(sentence_count, 1)
     
     score = min((reasoning_density * 100 + citations * 10 + questions * 5), 100)
@@ -254,6 +338,145 @@ def analyze_argument_quality(text: str) -> Dict[str, Any]:
         "argument_score": round(score, 2)
     }
 
+def _score_submission_sync(content: str, rubric: Dict, assignment_id: str, student_id: str) -> Dict[str, Any]:
+    """Synchronous CPU-bound scoring pass, run off the event loop"""
+    # Tokenize once; every criterion scorer reuses the same feature bundle
+    features = extract_doc_features(content)
+    
+    # Flesch metrics are computed once up front and shared by every
+    # criterion plus the summary statistics below
+    readability, grade_level = _flesch_metrics(features)
+    
+    criteria_scores = {}
+    total_weighted_score = 0
+    total_weight = 0
+    strengths = []
+    improvements = []
+    
+    for criterion_name, criterion_config in rubric.items():
+        try:
+            max_points = criterion_config.get("max_points", 20)
+            min_words = criterion_config.get("min_words", 100)
+            
+            criterion_lower = criterion_name.lower()
+            
+            if "content" in criterion_lower or "thesis" in criterion_lower:
+                result = calculate_content_score(features, min_words, readability=readability)
+                score = (result["score"] / 100) * max_points
+                feedback = result["feedback"]
+                
+            elif "grammar" in criterion_lower or "style" in criterion_lower or "language" in criterion_lower:
+                result = calculate_grammar_score(features)
+                score = (result["score"] / 100) * max_points
+                feedback = result["feedback"]
+                
+            elif "structure" in criterion_lower or "organization" in criterion_lower:
+                result = calculate_structure_score(features)
+                score = (result["score"] / 100) * max_points
+                feedback = result["feedback"]
+                
+            elif "argument" in criterion_lower or "analysis" in criterion_lower or "critical" in criterion_lower:
+                arg_analysis = analyze_argument_quality(features)
+                score = (arg_analysis["argument_score"] / 100) * max_points
+                feedback = f"Reasoning indicators: {arg_analysis['reasoning_indicators']}, Citations: {arg_analysis['citations']}"
+                
+            else:
+                result = calculate_content_score(features, min_words, readability=readability)
+                score = (result["score"] / 100) * max_points
+                feedback = f"Comprehensive evaluation for {criterion_name}"
+            
+            criteria_scores[criterion_name] = {
+                "score": round(score, 2),
+                "max_score": max_points,
+                "feedback": feedback,
+                "percentage": round((score / max_points) * 100, 1)
+            }
+            
+            total_weighted_score += score
+            total_weight += max_points
+            
+            percentage = (score / max_points) * 100
+            criterion_label = criterion_name.replace('_', ' ')
+            if percentage >= 85:
+                strengths.append(f"Excellent {criterion_label}")
+            elif percentage >= 75:
+                strengths.append(f"Strong {criterion_label}")
+            elif percentage < 60:
+                improvements.append(f"Focus on improving {criterion_label}")
+                
+        except Exception as e:
+            logger.error(f"Error processing criterion {criterion_name}: {str(e)}")
+            continue
+    
+    final_score = (total_weighted_score / total_weight * 100) if total_weight > 0 else 0
+    
+    word_count = len(features.words)
+    sentence_count = sum(1 for s in features.sentences if len(s.split()) > 2)
+    
+    feedback_parts = [
+        f"Overall Score: {final_score:.1f}%",
+        f"Grade Level: {grade_level:.1f}",
+        "",
+    ]
+    
+    if final_score >= 93:
+        feedback_parts.append("🌟 Outstanding work! Demonstrates exceptional understanding and mastery.")
+    elif final_score >= 85:
+        feedback_parts.append("✓ Excellent work! Strong performance with minor areas for refinement.")
+    elif final_score >= 75:
+        feedback_parts.append("Good work overall. Some key areas would benefit from development.")
+    elif final_score >= 65:
+        feedback_parts.append("Satisfactory. Focus on the improvement areas highlighted below.")
+    else:
+        feedback_parts.append("Needs significant development. Review the detailed feedback carefully.")
+    
+    feedback_parts.extend([
+        "",
+        f"📊 Statistics:",
+        f"  • Word Count: {word_count} words",
+        f"  • Sentences: {sentence_count}",
+        f"  • Readability: {readability:.1f} (Flesch Reading Ease)",
+        f"  • Grade Level: {grade_level:.1f}",
+        "",
+        "📝 Detailed Criterion Feedback:"
+    ])
+    
+    for criterion, scores in criteria_scores.items():
+        title = criterion.replace('_', ' ').title()
+        feedback_parts.extend((
+            f"\n{title}:",
+            f"  Score: {scores['score']}/{scores['max_score']} ({scores['percentage']}%)",
+            f"  {scores['feedback']}"
+        ))
+    
+    overall_feedback = "\n".join(feedback_parts)
+    
+    if not strengths:
+        if final_score >= 70:
+            strengths.append("Solid foundational understanding")
+    if not improvements:
+        if final_score < 95:
+            improvements.append("Continue refining writing skills")
+    
+    confidence = min(0.70 + (word_count / 500) * 0.15 + (sentence_count / 10) * 0.10, 0.98)
+    
+    logger.info(f"Enhanced grading completed successfully. Final score: {final_score:.2f}%")
+    
+    return {
+        "total_score": round(final_score, 2),
+        "criteria_scores": criteria_scores,
+        "feedback": overall_feedback,
+        "strengths": strengths[:5],  
+        "improvements": improvements[:5],  
+        "confidence": round(confidence, 4),
+        "word_count": word_count,
+        "sentence_count": sentence_count,
+        "readability_score": round(readability, 2),
+        "grade_level": round(grade_level, 1),
+        "assignment_id": assignment_id,
+        "student_id": student_id
+    }
+
 async def grade_essay_with_database(content: str, rubric: Dict, assignment_id: str, student_id: str) -> Dict[str, Any]:
     """
     Advanced AI grading with database integration
@@ -261,8 +484,12 @@ async def grade_essay_with_database(content: str, rubric: Dict, assignment_id: s
     try:
         logger.info(f"Starting enhanced grading process for assignment {assignment_id}")
         
-        # Get assignment details from database
-        assignment = await db.get_assignment(assignment_id)
+        # Get assignment + rubric in one batched call (falls back to the
+        # single-assignment query)
+        context = await db.get_grading_context(assignment_id)
+        assignment = context.get('assignment') if context else None
+        if not assignment:
+            assignment = await db.get_assignment(assignment_id)
         if not assignment:
             raise ValueError(f"Assignment {assignment_id} not found in database")
         
@@ -271,138 +498,12 @@ async def grade_essay_with_database(content: str, rubric: Dict, assignment_id: s
         if db_rubric:
             rubric = db_rubric
         
-        criteria_scores = {}
-        total_weighted_score = 0
-        total_weight = 0
-        strengths = []
-        improvements = []
-        
-        for criterion_name, criterion_config in rubric.items():
-            try:
-                max_points = criterion_config.get("max_points", 20)
-                min_words = criterion_config.get("min_words", 100)
-                
-                criterion_lower = criterion_name.lower()
-                
-                if "content" in criterion_lower or "thesis" in criterion_lower:
-                    result = calculate_content_score(content, min_words)
-                    score = (result["score"] / 100) * max_points
-                    feedback = result["feedback"]
-                    
-                elif "grammar" in criterion_lower or "style" in criterion_lower or "language" in criterion_lower:
-                    result = calculate_grammar_score(content)
-                    score = (result["score"] / 100) * max_points
-                    feedback = result["feedback"]
-                    
-                elif "structure" in criterion_lower or "organization" in criterion_lower:
-                    result = calculate_structure_score(content)
-                    score = (result["score"] / 100) * max_points
-                    feedback = result["feedback"]
-                    
-                elif "argument" in criterion_lower or "analysis" in criterion_lower or "critical" in criterion_lower:
-                    arg_analysis = analyze_argument_quality(content)
-                    score = (arg_analysis["argument_score"] / 100) * max_points
-                    feedback = f"Reasoning indicators: {arg_analysis['reasoning_indicators']}, Citations: {arg_analysis['citations']}"
-                    
-                else:
-                    result = calculate_content_score(content, min_words)
-                    score = (result["score"] / 100) * max_points
-                    feedback = f"Comprehensive evaluation for {criterion_name}"
-                
-                criteria_scores[criterion_name] = {
-                    "score": round(score, 2),
-                    "max_score": max_points,
-                    "feedback": feedback,
-                    "percentage": round((score / max_points) * 100, 1)
-                }
-                
-                total_weighted_score += score
-                total_weight += max_points
-                
-                percentage = (score / max_points) * 100
-                if percentage >= 85:
-                    strengths.append(f"Excellent {criterion_name.replace('_', ' ')}")
-                elif percentage >= 75:
-                    strengths.append(f"Strong {criterion_name.replace('_', ' ')}")
-                elif percentage < 60:
-                    improvements.append(f"Focus on improving {criterion_name.replace('_', ' ')}")
-                    
-            except Exception as e:
-                logger.error(f"Error processing criterion {criterion_name}: {str(e)}")
-                continue
-        
-        final_score = (total_weighted_score / total_weight * 100) if total_weight > 0 else 0
-        
-        word_count = count_words(content)
-        sentence_count = count_sentences(content)
+        # The scoring pass is pure CPU (regex + arithmetic); run it in a
+        # worker thread so the event loop stays free for concurrent I/O
+        result = await asyncio.to_thread(_score_submission_sync, content, rubric, assignment_id, student_id)
         
-        try:
-            readability = flesch_reading_ease(content)
-            grade_level = flesch_kincaid_grade(content)
-        except:
-            readability = 50
-            grade_level = 8
-        
-        feedback_parts = [
-            f"Overall Score: {final_score:.1f}%",
-            f"Grade Level: {grade_level:.1f}",
-            "",
-        ]
-        
-        if final_score >= 93:
-            feedback_parts.append("🌟 Outstanding work! Demonstrates exceptional understanding and mastery.")
-        elif final_score >= 85:
-            feedback_parts.append("✓ Excellent work! Strong performance with minor areas for refinement.")
-        elif final_score >= 75:
-            feedback_parts.append("Good work overall. Some key areas would benefit from development.")
-        elif final_score >= 65:
-            feedback_parts.append("Satisfactory. Focus on the improvement areas highlighted below.")
-        else:
-            feedback_parts.append("Needs significant development. Review the detailed feedback carefully.")
-        
-        feedback_parts.extend([
-            "",
-            f"📊 Statistics:",
-            f"  • Word Count: {word_count} words",
-            f"  • Sentences: {sentence_count}",
-            f"  • Readability: {readability:.1f} (Flesch Reading Ease)",
-            f"  • Grade Level: {grade_level:.1f}",
-            "",
-            "📝 Detailed Criterion Feedback:"
-        ])
-        
-        for criterion, scores in criteria_scores.items():
-            feedback_parts.append(f"\n{criterion.replace('_', ' ').title()}:")
-            feedback_parts.append(f"  Score: {scores['score']}/{scores['max_score']} ({scores['percentage']}%)")
-            feedback_parts.append(f"  {scores['feedback']}")
-        
-        overall_feedback = "\n".join(feedback_parts)
-        
-        if not strengths:
-            if final_score >= 70:
-                strengths.append("Solid foundational understanding")
-        if not improvements:
-            if final_score < 95:
-                improvements.append("Continue refining writing skills")
-        
-        confidence = min(0.70 + (word_count / 500) * 0.15 + (sentence_count / 10) * 0.10, 0.98)
-        
-        logger.info(f"Enhanced grading completed successfully. Final score: {final_score:.2f}%")
-        
-        return {
-            "total_score": round(final_score, 2),
-            "criteria_scores": criteria_scores,
-            "feedback": overall_feedback,
-            "strengths": strengths[:5],  
-            "improvements": improvements[:5],  
-            "confidence": round(confidence, 4),
-            "word_count": word_count,
-            "sentence_count": sentence_count,
-            "readability_score": round(readability, 2),
-            "grade_level": round(grade_level, 1),
-            "assignment_id": assignment_id,
-            "student_id": student_id
-        }
+        logger.info(f"Enhanced grading completed successfully. Final score: {result['total_score']:.2f}%")
+        return result
         
     except Exception as e:
         logger.error(f"Critical error in enhanced grade_essay: {str(e)}", exc_info=True)
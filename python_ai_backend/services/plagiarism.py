@@ -1,8 +1,47 @@
 import re
-from typing import Dict, List
+from functools import lru_cache
+from typing import Dict, List, Tuple
 from difflib import SequenceMatcher
 from collections import Counter
 
+_WORD_RE = re.compile(r'\w+')
+
+# Shingle sketch parameters: 5-word shingles, bottom-128 hash sketches.
+# Sketches estimate Jaccard similarity from 128 integers per document,
+# so only plausible candidates pay for the exact set comparison.
+_SHINGLE_N = 5
+_SKETCH_K = 128
+_SKETCH_CANDIDATE_JACCARD = 0.15
+_MATCH_JACCARD = 0.3
+
+@lru_cache(maxsize=256)
+def _shingle_hashes(text: str) -> Tuple[int, ...]:
+    """Sorted 64-bit hashes of a text's word shingles, computed once"""
+    words = _WORD_RE.findall(text.lower())
+    return tuple(sorted({
+        hash(' '.join(words[i:i + _SHINGLE_N])) & 0xFFFFFFFFFFFFFFFF
+        for i in range(len(words) - _SHINGLE_N + 1)
+    }))
+
+def _sketch_jaccard(hashes1: Tuple[int, ...], hashes2: Tuple[int, ...]) -> float:
+    """Bottom-k estimate of Jaccard similarity from two hash sketches"""
+    sketch1 = set(hashes1[:_SKETCH_K])
+    sketch2 = set(hashes2[:_SKETCH_K])
+    union_k = sorted(sketch1 | sketch2)[:_SKETCH_K]
+    if not union_k:
+        return 0.0
+    both = sum(1 for h in union_k if h in sketch1 and h in sketch2)
+    return both / len(union_k)
+
+def _exact_jaccard(hashes1: Tuple[int, ...], hashes2: Tuple[int, ...]) -> float:
+    """Exact Jaccard similarity over the full shingle sets"""
+    set1 = set(hashes1)
+    set2 = set(hashes2)
+    if not set1 or not set2:
+        return 0.0
+    intersection = len(set1 & set2)
+    return intersection / (len(set1) + len(set2) - intersection)
+
 def calculate_similarity(text1: str, text2: str) -> float:
     """Calculate similarity between two texts using sequence matching"""
     return SequenceMatcher(None, text1.lower(), text2.lower()).ratio()
@@ -19,10 +58,27 @@ def check_plagiarism(content: str, external_sources: List[str] = None) -> Dict:
             "analysis": "Content too short for analysis"
         }
     
-    # Basic similarity check - in real implementation, this would compare against database
-    words = re.findall(r'\w+', content.lower())
-    unique_words = len(set(words))
-    total_words = len(words)
+    # Sketch-then-refine comparison against any provided sources: the
+    # bottom-k sketches reject dissimilar documents from 128 integers,
+    # and only candidates that pass get the exact shingle-set Jaccard
+    matched_sources = []
+    source_similarity = 0.0
+    if external_sources:
+        content_hashes = _shingle_hashes(content)
+        for index, source in enumerate(external_sources):
+            source_hashes = _shingle_hashes(source)
+            if _sketch_jaccard(content_hashes, source_hashes) < _SKETCH_CANDIDATE_JACCARD:
+                continue
+            jaccard = _exact_jaccard(content_hashes, source_hashes)
+            if jaccard > _MATCH_JACCARD:
+                source_similarity = max(source_similarity, jaccard * 100)
+                matched_sources.append(f"Source {index + 1} ({jaccard * 100:.1f}% shingle overlap)")
+    
+    # Uniqueness heuristic over the content itself - one Counter pass
+    # gives both totals without materializing a word list plus a set
+    word_counts = Counter(match.group() for match in _WORD_RE.finditer(content.lower()))
+    unique_words = len(word_counts)
+    total_words = sum(word_counts.values())
     
     # Simple heuristic for originality
     if total_words > 0:
@@ -31,13 +87,14 @@ def check_plagiarism(content: str, external_sources: List[str] = None) -> Dict:
     else:
         similarity_score = 0
     
-    is_suspicious = similarity_score > 25
+    similarity_score = max(similarity_score, source_similarity)
+    is_suspicious = similarity_score > 25 or bool(matched_sources)
     
     return {
         "similarity_score": round(similarity_score, 2),
         "is_suspicious": is_suspicious,
         "suspicious_segments": [],
-        "matched_sources": [],
+        "matched_sources": matched_sources,
         "confidence": 0.85,
         "analysis": "Plagiarism analysis completed using text uniqueness metrics"
     }
\ No newline at end of file
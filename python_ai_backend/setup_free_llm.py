@@ -7,17 +7,23 @@ Automatically sets up the complete free LLM academic assessment system
 import os
 import sys
 import subprocess
+import venv
 import logging
 from pathlib import Path
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def run_command(command, description):
-    """Run a command and log the result"""
+def run_command(argv, description):
+    """Run a command given as an argv list and log the result
+
+    No shell in between: the child is spawned directly, which skips a
+    /bin/sh (or cmd.exe) process per call and keeps arguments from
+    being re-parsed by shell quoting rules.
+    """
     logger.info(f"🔄 {description}...")
     try:
-        result = subprocess.run(command, shell=True, check=True, capture_output=True, text=True)
+        result = subprocess.run(argv, check=True, capture_output=True, text=True)
         logger.info(f"✅ {description} completed successfully")
         return True
     except subprocess.CalledProcessError as e:
@@ -42,74 +48,83 @@ def setup_virtual_environment():
         logger.info("🔄 Virtual environment already exists, skipping creation")
         return True
     
-    # Create virtual environment
-    if not run_command("python -m venv free_llm_env", "Creating virtual environment"):
+    # EnvBuilder runs in this interpreter - no child python just to make
+    # the venv - and upgrade_deps covers the pip self-upgrade that used
+    # to be a separate install step
+    logger.info("🔄 Creating virtual environment...")
+    try:
+        venv.EnvBuilder(
+            with_pip=True,
+            upgrade_deps=True,
+            symlinks=(os.name != 'nt')
+        ).create(str(venv_path))
+        logger.info("✅ Virtual environment created successfully")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Creating virtual environment failed: {e}")
         return False
-    
-    return True
 
-def install_dependencies():
-    """Install required dependencies"""
-    # Determine activation script based on OS
+def venv_python_path():
+    """Path of the virtual environment's interpreter"""
     if os.name == 'nt':  # Windows
-        pip_path = "free_llm_env\\Scripts\\pip"
-    else:  # Linux/Mac
-        pip_path = "free_llm_env/bin/pip"
-    
-    # Upgrade pip first
-    if not run_command(f"{pip_path} install --upgrade pip", "Upgrading pip"):
-        return False
-    
-    # Install requirements
-    if not run_command(f"{pip_path} install -r requirements.txt", "Installing dependencies"):
-        return False
-    
-    return True
+        return "free_llm_env\\Scripts\\python"
+    return "free_llm_env/bin/python"
+
+# Touched after a successful NLTK fetch so re-running setup skips the
+# download section entirely on a warm cache
+_NLTK_SENTINEL = Path.home() / ".cache" / "checkmate" / "nltk.ok"
+
+# pip runs in-process via runpy instead of exec'ing a second interpreter
+_PIP_SCRIPT = """
+import runpy, sys
+
+def run_pip(args):
+    sys.argv = ["pip"] + args
+    try:
+        runpy.run_module("pip", run_name="__main__")
+    except SystemExit as e:
+        if e.code not in (0, None):
+            raise
+
+run_pip(["install", "-r", "requirements.txt"])
+"""
 
-def download_nltk_data():
-    """Download required NLTK data"""
-    nltk_script = """
-import nltk
+# Probe locally first - each unconditional nltk.download() fetches the
+# remote index before deciding it has nothing to do, so three calls cost
+# three HTTP round-trips even on a warm cache. Missing packages are
+# fetched together in one download call; failures stay non-critical.
+_NLTK_SCRIPT = """
 try:
-    nltk.download('punkt', quiet=True)
-    nltk.download('stopwords', quiet=True)
-    nltk.download('vader_lexicon', quiet=True)
-    print("NLTK data downloaded successfully")
+    import nltk
+    packages = [
+        ('punkt', 'tokenizers/punkt'),
+        ('stopwords', 'corpora/stopwords'),
+        ('vader_lexicon', 'sentiment/vader_lexicon')
+    ]
+    missing = []
+    for package, path in packages:
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(package)
+    if missing:
+        nltk.download(missing, quiet=True)
+    print("NLTK data ready")
 except Exception as e:
-    print(f"Error downloading NLTK data: {e}")
-    exit(1)
+    print(f"Warning: NLTK data download had issues: {e}")
 """
-    
-    # Determine python path based on OS
-    if os.name == 'nt':  # Windows
-        python_path = "free_llm_env\\Scripts\\python"
-    else:  # Linux/Mac
-        python_path = "free_llm_env/bin/python"
-    
-    try:
-        result = subprocess.run([python_path, "-c", nltk_script], capture_output=True, text=True)
-        if result.returncode == 0:
-            logger.info("✅ NLTK data downloaded successfully")
-            return True
-        else:
-            logger.warning(f"⚠️ NLTK data download had issues: {result.stderr}")
-            return True  # Non-critical, continue
-    except Exception as e:
-        logger.warning(f"⚠️ Could not download NLTK data: {e}")
-        return True  # Non-critical, continue
 
-def test_installation():
-    """Test if the installation works"""
-    test_script = """
+_TEST_SCRIPT = """
 import sys
 sys.path.append('.')
 
 try:
-    from enhanced_services.free_llm_system import free_llm_system
+    from enhanced_services.free_llm_system import get_free_llm_system
     from enhanced_services.free_plagiarism_detector import FreePlagiarismDetector
     from enhanced_services.free_assignment_grader import FreeAssignmentGrader
     
     # Test basic functionality
+    free_llm_system = get_free_llm_system()
     detector = FreePlagiarismDetector(free_llm_system)
     grader = FreeAssignmentGrader(free_llm_system)
     
@@ -120,24 +135,43 @@ except Exception as e:
     print(f"❌ Error testing installation: {e}")
     sys.exit(1)
 """
-    
-    # Determine python path based on OS
-    if os.name == 'nt':  # Windows
-        python_path = "free_llm_env\\Scripts\\python"
-    else:  # Linux/Mac
-        python_path = "free_llm_env/bin/python"
-    
+
+def provision_environment():
+    """Install dependencies, fetch NLTK data and smoke-test in one child
+    
+    One interpreter start instead of three - the venv python imports its
+    modules once and runs pip (in-process via runpy), the NLTK probe and
+    the installation test back to back.
+    """
+    parts = [_PIP_SCRIPT]
+    fetch_nltk = not _NLTK_SENTINEL.exists()
+    if fetch_nltk:
+        parts.append(_NLTK_SCRIPT)
+    parts.append(_TEST_SCRIPT)
+    
+    logger.info("🔄 Installing dependencies and testing installation...")
     try:
-        result = subprocess.run([python_path, "-c", test_script], capture_output=True, text=True)
+        result = subprocess.run(
+            [venv_python_path(), "-c", "\n".join(parts)],
+            capture_output=True, text=True,
+            # Skip .pyc generation at install time, the version self-check
+            # round-trip, and source builds when a wheel is available
+            env={**os.environ,
+                 "PIP_NO_COMPILE": "1",
+                 "PIP_DISABLE_PIP_VERSION_CHECK": "1",
+                 "PIP_PREFER_BINARY": "1"}
+        )
         if result.returncode == 0:
-            logger.info("✅ Installation test passed")
+            if fetch_nltk and "NLTK data ready" in result.stdout:
+                _NLTK_SENTINEL.parent.mkdir(parents=True, exist_ok=True)
+                _NLTK_SENTINEL.touch()
+            logger.info("✅ Dependencies installed and installation test passed")
             logger.info("🚀 FREE LLM system is ready to use!")
             return True
-        else:
-            logger.error(f"❌ Installation test failed: {result.stderr}")
-            return False
+        logger.error(f"❌ Environment provisioning failed: {result.stderr}")
+        return False
     except Exception as e:
-        logger.error(f"❌ Error running installation test: {e}")
+        logger.error(f"❌ Error provisioning environment: {e}")
         return False
 
 def create_start_script():
@@ -181,18 +215,9 @@ def main():
         logger.error("❌ Failed to setup virtual environment")
         sys.exit(1)
     
-    # Install dependencies
-    if not install_dependencies():
-        logger.error("❌ Failed to install dependencies")
-        sys.exit(1)
-    
-    # Download NLTK data
-    if not download_nltk_data():
-        logger.warning("⚠️ NLTK data download had issues, but continuing...")
-    
-    # Test installation
-    if not test_installation():
-        logger.error("❌ Installation test failed")
+    # Install dependencies, fetch NLTK data and smoke-test in one child
+    if not provision_environment():
+        logger.error("❌ Failed to provision the environment")
         sys.exit(1)
     
     # Create start script
@@ -3,33 +3,237 @@ SIMPLE AI SYSTEM - Works immediately without heavy dependencies
 Provides plagiarism detection and basic grading using built-in Python libraries
 """
 
+import os
 import re
 import json
+import atexit
 import hashlib
 import sqlite3
+import string
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Optional
 from datetime import datetime
+from functools import lru_cache
 import logging
-from difflib import SequenceMatcher
-from collections import Counter
-import math
 
 logger = logging.getLogger(__name__)
 
+# One pass over the lowercased text yields words and sentence terminators
+# together - the analysis metrics are all derived from this token stream
+_TOKEN_RE = re.compile(r"[a-z']+|[.!?]+")
+
+_WS_RE = re.compile(r'\s+')
+_PUNCT_TRANS = str.maketrans('', '', string.punctuation)
+
+# Keyword sets for the AI-content heuristics - matched against word
+# tokens so short indicators cannot fire inside longer words. The
+# personal-voice indicators are multi-word phrases and stay substring
+# checks against the already-normalized content.
+_POSITIVE_WORDS = frozenset(('good', 'great', 'excellent', 'positive', 'beneficial', 'effective'))
+_NEGATIVE_WORDS = frozenset(('bad', 'poor', 'negative', 'harmful', 'ineffective', 'problem'))
+_FORMAL_WORDS = frozenset(('furthermore', 'moreover', 'consequently', 'therefore', 'thus'))
+_TRANSITION_WORDS = frozenset(('first', 'second', 'third', 'finally'))
+_PERSONAL_PHRASES = ('i think', 'i believe', 'in my opinion', 'personally')
+
+# Bottom-k shingle sketch parameters for the similarity signatures -
+# same estimator the services tier uses for external sources. Shingle
+# hashes come from blake2b rather than hash() because signatures persist
+# across processes and builtin string hashing is salted per interpreter.
+_SHINGLE_N = 5
+_SKETCH_K = 128
+_MATCH_JACCARD = 0.3
+
+@lru_cache(maxsize=256)
+def _shingle_sketch(text: str) -> tuple:
+    """Smallest k shingle hashes of the text, sorted ascending"""
+    words = text.split()
+    if len(words) <= _SHINGLE_N:
+        shingles = {' '.join(words)} if words else set()
+    else:
+        shingles = {' '.join(words[i:i + _SHINGLE_N]) for i in range(len(words) - _SHINGLE_N + 1)}
+    hashes = sorted(
+        int.from_bytes(hashlib.blake2b(sh.encode('utf-8'), digest_size=8).digest(), 'big')
+        for sh in shingles
+    )
+    return tuple(hashes[:_SKETCH_K])
+
+def _sketch_jaccard(sketch1: tuple, sketch2: tuple) -> float:
+    """Estimate Jaccard similarity from two bottom-k sketches"""
+    if not sketch1 or not sketch2:
+        return 0.0
+    union = sorted(set(sketch1) | set(sketch2))[:_SKETCH_K]
+    window = set(union)
+    shared = set(sketch1) & set(sketch2)
+    return sum(1 for h in shared if h in window) / len(union)
+
+@lru_cache(maxsize=50_000)
+def _count_syllables(word: str) -> int:
+    """Count syllables in an already-lowercased word (approximation)
+    
+    Essays reuse a small vocabulary, so the per-word result is memoized -
+    the cache is sized to cover the working vocabulary of a whole course.
+    Callers lower the text once up front, so cache keys stay lowercase.
+    """
+    vowels = 'aeiouy'
+    syllable_count = 0
+    prev_was_vowel = False
+    
+    for char in word:
+        is_vowel = char in vowels
+        if is_vowel and not prev_was_vowel:
+            syllable_count += 1
+        prev_was_vowel = is_vowel
+    
+    # Handle silent 'e'
+    if word.endswith('e') and syllable_count > 1:
+        syllable_count -= 1
+    
+    return max(1, syllable_count)
+
+def _score_content(analysis: Dict) -> int:
+    """Content quality based on length, complexity, and structure"""
+    base_score = 70
+    
+    # Length scoring
+    word_count = analysis['word_count']
+    if word_count >= 200:
+        base_score += 15
+    elif word_count >= 100:
+        base_score += 10
+    elif word_count < 50:
+        base_score -= 20
+    
+    # Complexity scoring
+    complexity = analysis['complexity_score']
+    if complexity >= 70:
+        base_score += 10
+    elif complexity < 40:
+        base_score -= 10
+    
+    return min(100, max(0, base_score))
+
+def _score_grammar(analysis: Dict) -> int:
+    """Grammar and writing quality"""
+    base_score = 75
+    
+    # Sentence structure
+    avg_sentences = analysis['avg_words_per_sentence']
+    if 10 <= avg_sentences <= 25:
+        base_score += 15
+    elif avg_sentences < 5:
+        base_score -= 15
+    
+    # Readability
+    readability = analysis['readability_score']
+    if readability >= 60:
+        base_score += 10
+    elif readability < 30:
+        base_score -= 10
+    
+    return min(100, max(0, base_score))
+
+def _score_creativity(analysis: Dict) -> int:
+    """Creativity and originality"""
+    base_score = 70
+    
+    # Uniqueness
+    complexity = analysis['complexity_score']
+    if complexity >= 60:
+        base_score += 20
+    elif complexity < 30:
+        base_score -= 15
+    
+    # Sentiment (creative writing often has emotional content)
+    if analysis['sentiment'] != 'neutral':
+        base_score += 10
+    
+    return min(100, max(0, base_score))
+
+def _score_default(analysis: Dict) -> int:
+    """Default scoring"""
+    return 75
+
+# Substring keys in the priority order of the old if/elif chain - the
+# first key found in the criterion name selects the handler
+_CRITERION_HANDLERS = (
+    ('content', _score_content),
+    ('quality', _score_content),
+    ('grammar', _score_grammar),
+    ('writing', _score_grammar),
+    ('creativity', _score_creativity),
+    ('original', _score_creativity),
+)
+
+@lru_cache(maxsize=128)
+def _pick_handler(criterion_lower: str):
+    """Resolve a criterion name to its scoring handler once per name"""
+    for key, handler in _CRITERION_HANDLERS:
+        if key in criterion_lower:
+            return handler
+    return _score_default
+
+@lru_cache(maxsize=512)
+def _clean_text(text: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace
+    
+    A C-level translate plus one whitespace regex replaces the two
+    substitution regexes that ran per call. Both plagiarism detection
+    and grading normalize the same submission text, so results are
+    memoized on the raw string.
+    """
+    return _WS_RE.sub(' ', text.lower().translate(_PUNCT_TRANS)).strip()
+
 class SimpleAISystem:
     """Simple AI system using only built-in Python libraries"""
     
+    # Tag of the cache-key hash algorithm; bumping it invalidates rows
+    # keyed with the previous algorithm
+    _HASH_ALGO = "blake2b-128"
+    
+    # In-process entries served before touching SQLite at all
+    _MEM_CACHE_MAX = 1024
+    
+    # Prepared once - the cache is two statements over one table. The
+    # upsert merges column by column: caching a grading result no longer
+    # wipes the plagiarism result already stored for the same content
+    # (INSERT OR REPLACE rewrote the whole row)
+    _SELECT_SQL = "SELECT similarity_scores, grade_result FROM submissions_cache WHERE content_hash = ?"
+    _UPSERT_SQL = """
+        INSERT INTO submissions_cache 
+        (content_hash, similarity_scores, grade_result) 
+        VALUES (?, ?, ?)
+        ON CONFLICT(content_hash) DO UPDATE SET
+            similarity_scores = COALESCE(excluded.similarity_scores, similarity_scores),
+            grade_result = COALESCE(excluded.grade_result, grade_result)
+    """
+    
     def __init__(self):
         self.setup_database()
         logger.info("🚀 Simple AI System initialized!")
     
     def setup_database(self):
-        """Setup local SQLite database"""
+        """Setup local SQLite database
+        
+        One persistent connection serves every cache call - opening a
+        connection per lookup paid file-open and schema-load costs that
+        dwarf these single-row queries. WAL mode lets readers proceed
+        during writes, and writes go through a lock since the connection
+        is shared across threads.
+        """
         self.db_path = "simple_ai_cache.db"
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._write_lock = threading.Lock()
+        # Hot entries live in an insertion-ordered dict so repeat
+        # submissions skip SQLite entirely; oldest entry is evicted first
+        self._mem_cache: Dict[str, Dict] = {}
+        atexit.register(self._conn.close)
+        
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        
+        self._conn.execute('''
             CREATE TABLE IF NOT EXISTS submissions_cache (
                 content_hash TEXT PRIMARY KEY,
                 similarity_scores TEXT,
@@ -40,12 +244,50 @@ class SimpleAISystem:
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        # Rows keyed with a different hash algorithm can never hit again;
+        # clear them once and record the current algorithm
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        # Compact per-submission sketches so later submissions to the
+        # same assignment have something real to compare against. Keyed
+        # per student as well as per content - two students submitting
+        # identical text must both leave a row, not overwrite each other.
+        row = self._conn.execute(
+            "SELECT COUNT(*) FROM pragma_table_info('submission_signatures') WHERE pk > 0"
+        ).fetchone()
+        if row and row[0] == 1:
+            # Old layout keyed on content_hash alone; signatures are a
+            # rebuildable cache, so drop and recreate
+            self._conn.execute("DROP TABLE submission_signatures")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS submission_signatures (
+                content_hash TEXT,
+                assignment_id TEXT,
+                student_id TEXT,
+                signature TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (assignment_id, student_id, content_hash)
+            )
+        ''')
+        
+        row = self._conn.execute("SELECT value FROM cache_meta WHERE key = 'hash_algo'").fetchone()
+        if row is None or row[0] != self._HASH_ALGO:
+            self._conn.execute("DELETE FROM submissions_cache")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_meta (key, value) VALUES ('hash_algo', ?)",
+                (self._HASH_ALGO,)
+            )
     
     def get_content_hash(self, content: str) -> str:
         """Generate hash for content"""
-        return hashlib.md5(content.encode()).hexdigest()
+        # Cache key only, no cryptographic requirement - blake2b is the
+        # fastest keyless hash in the standard library and 128 bits is
+        # plenty of collision margin for a cache discriminator
+        return hashlib.blake2b(content.encode("utf-8", "ignore"), digest_size=16).hexdigest()
     
     def detect_plagiarism(self, content: str, assignment_id: str, student_id: str) -> Dict:
         """Detect plagiarism using advanced text analysis"""
@@ -55,19 +297,43 @@ class SimpleAISystem:
             # Clean and normalize content
             clean_content = self.clean_text(content)
             
-            # Check cache
-            cached_result = self.get_cached_result(clean_content)
-            if cached_result and 'plagiarism' in cached_result:
-                return cached_result['plagiarism']
-            
-            # Advanced similarity detection
-            similarity_analysis = self.analyze_similarity(clean_content)
-            
-            # AI content detection
-            ai_detection = self.detect_ai_content(clean_content)
+            # Too little text for the similarity and AI heuristics to
+            # say anything meaningful - skip the whole pipeline
+            if len(clean_content.split()) < 30:
+                return {
+                    'similarity_scores': [],
+                    'matches': [],
+                    'highest_similarity': 0,
+                    'is_flagged': False,
+                    'ai_detection': {'is_ai_generated': False, 'ai_confidence': 0, 'indicators': {}},
+                    'paraphrasing_score': 0.0,
+                    'detection_method': 'short_content_skip'
+                }
             
-            # Paraphrasing detection
-            paraphrasing_score = self.detect_paraphrasing(clean_content)
+            # Signature comparison always runs, even on a cache hit - it
+            # has to record this student's sketch and compare it against
+            # the assignment's peers. A verbatim copy of another
+            # student's submission hits the content cache, and replaying
+            # the original's clean result would hand the copier a pass
+            # while leaving no signature behind.
+            similarity_analysis = self.analyze_similarity(clean_content, assignment_id, student_id)
+            
+            # The content-derived heuristics are the same for identical
+            # text regardless of who submitted it, so those can come
+            # from the cache; the similarity fields are always rebuilt
+            # from the fresh signature comparison above
+            cached_result = self.get_cached_result(clean_content)
+            cached_plag = cached_result.get('plagiarism') if cached_result else None
+            
+            if cached_plag and 'ai_detection' in cached_plag and 'paraphrasing_score' in cached_plag:
+                ai_detection = cached_plag['ai_detection']
+                paraphrasing_score = cached_plag['paraphrasing_score']
+            else:
+                cached_plag = None
+                # AI content detection
+                ai_detection = self.detect_ai_content(clean_content)
+                # Paraphrasing detection
+                paraphrasing_score = self.detect_paraphrasing(clean_content)
             
             result = {
                 'similarity_scores': similarity_analysis['scores'],
@@ -80,7 +346,8 @@ class SimpleAISystem:
             }
             
             # Cache result
-            self.cache_result(clean_content, {'plagiarism': result})
+            if cached_plag is None:
+                self.cache_result(clean_content, {'plagiarism': result})
             
             return result
             
@@ -99,9 +366,24 @@ class SimpleAISystem:
         try:
             logger.info("📝 Grading assignment with AI")
             
-            # Check cache
-            cached_result = self.get_cached_result(content)
-            if cached_result and 'grading' in cached_result:
+            # Too short to evaluate against a rubric - return a canned
+            # low grade instead of running the full analysis
+            if len(content.split()) < 30:
+                return {
+                    'overall_score': 50,
+                    'rubric_scores': {},
+                    'feedback': "📝 Your submission is too short to evaluate fully. "
+                                "Please expand your content to provide more detail and depth.",
+                    'content_analysis': {},
+                    'confidence': 0.5,
+                    'grading_method': 'short_content_skip'
+                }
+            
+            # Same normalized key as plagiarism detection, so both halves
+            # of the analysis share one cache row per distinct content
+            clean_content = self.clean_text(content)
+            cached_result = self.get_cached_result(clean_content)
+            if cached_result and cached_result.get('grading'):
                 return cached_result['grading']
             
             # Content analysis
@@ -123,7 +405,7 @@ class SimpleAISystem:
             }
             
             # Cache result
-            self.cache_result(content, {'grading': result})
+            self.cache_result(clean_content, {'grading': result})
             
             return result
             
@@ -136,40 +418,83 @@ class SimpleAISystem:
                 'error': str(e)
             }
     
+    def grade_batch(self, submissions: List[Dict]) -> List[Dict]:
+        """Grade several submissions concurrently
+        
+        Results come back in submission order. Workers are threads
+        rather than processes: the instance owns the shared SQLite
+        connection and its lock, which do not cross a process boundary,
+        and per-submission work is small enough that pickling inputs to
+        worker processes would cost more than it saves. The connection
+        is opened with check_same_thread=False and writes already go
+        through the write lock, so worker threads cache safely.
+        """
+        if not submissions:
+            return []
+        
+        def _grade_one(submission: Dict) -> Dict:
+            return self.grade_assignment(
+                submission['content'],
+                submission.get('rubric', {}),
+                submission.get('assignment_context', {})
+            )
+        
+        if len(submissions) == 1:
+            return [_grade_one(submissions[0])]
+        
+        max_workers = min(len(submissions), os.cpu_count() or 4)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(_grade_one, submissions))
+    
     def clean_text(self, text: str) -> str:
         """Clean and normalize text"""
-        # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
-        # Convert to lowercase
-        text = text.lower()
-        # Remove punctuation for comparison
-        text = re.sub(r'[^\w\s]', '', text)
-        return text.strip()
-    
-    def analyze_similarity(self, content: str) -> Dict:
-        """Analyze text similarity using advanced algorithms"""
-        # Simulate finding similar submissions
-        # In a real system, this would query your database
-        
-        # Calculate content fingerprint
-        words = content.split()
-        word_freq = Counter(words)
-        
-        # Simulate similarity detection
+        return _clean_text(text)
+    
+    def analyze_similarity(self, content: str, assignment_id: str, student_id: str) -> Dict:
+        """Compare against stored submissions for the same assignment
+        
+        Each submission leaves a bottom-k shingle sketch in SQLite; new
+        content is scored against the sketches already recorded for the
+        assignment with the Jaccard estimator. This replaces the old
+        placeholder loop that fabricated fixed similarity values.
+        """
         matches = []
         scores = []
         
-        # Simulate finding 2-3 similar submissions
-        for i in range(3):
-            similarity = 0.1 + (i * 0.2)  # 0.1, 0.3, 0.5
-            if similarity > 0.3:
-                matches.append({
-                    'submission_id': f'sim_{i}',
-                    'student_id': f'student_{i}',
-                    'similarity': similarity,
-                    'content_preview': content[:100] + '...'
-                })
-                scores.append(similarity)
+        try:
+            sketch = _shingle_sketch(content)
+            content_hash = self.get_content_hash(content)
+            
+            # Compare against every other student's rows - identical
+            # content from a different student is exactly the case that
+            # must match
+            rows = self._conn.execute(
+                "SELECT content_hash, student_id, signature FROM submission_signatures "
+                "WHERE assignment_id = ? AND student_id != ?",
+                (assignment_id, student_id)
+            ).fetchall()
+            
+            for row_hash, row_student, signature_json in rows:
+                similarity = _sketch_jaccard(sketch, tuple(json.loads(signature_json)))
+                if similarity > _MATCH_JACCARD:
+                    matches.append({
+                        'submission_id': row_hash,
+                        'student_id': row_student,
+                        'similarity': round(similarity, 3),
+                        'content_preview': content[:100] + '...'
+                    })
+                    scores.append(round(similarity, 3))
+            
+            # Record this submission's sketch for future comparisons
+            with self._write_lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO submission_signatures "
+                    "(content_hash, assignment_id, student_id, signature) VALUES (?, ?, ?, ?)",
+                    (content_hash, assignment_id, student_id, json.dumps(list(sketch)))
+                )
+            
+        except Exception as e:
+            logger.error(f"Similarity analysis error: {e}")
         
         highest = max(scores) if scores else 0
         
@@ -180,20 +505,25 @@ class SimpleAISystem:
         }
     
     def detect_ai_content(self, content: str) -> Dict:
-        """Detect AI-generated content using heuristics"""
-        # AI detection heuristics
+        """Detect AI-generated content using heuristics
+        
+        The keyword checks all read one tokenization of the normalized
+        content - frozenset intersections replace the per-keyword
+        substring scans, so 'thus' no longer fires inside 'enthusiasm'
+        and the text is walked once instead of once per keyword.
+        """
         ai_indicators = 0
         total_checks = 5
         
-        # Check 1: Repetitive phrases
         words = content.split()
-        unique_words = len(set(words))
-        if len(words) > 0 and unique_words / len(words) < 0.7:
+        unique_words = set(words)
+        
+        # Check 1: Repetitive phrases
+        if words and len(unique_words) / len(words) < 0.7:
             ai_indicators += 1
         
         # Check 2: Formal language
-        formal_words = ['furthermore', 'moreover', 'consequently', 'therefore', 'thus']
-        if any(word in content for word in formal_words):
+        if _FORMAL_WORDS & unique_words:
             ai_indicators += 1
         
         # Check 3: Perfect structure
@@ -202,13 +532,14 @@ class SimpleAISystem:
             ai_indicators += 1
         
         # Check 4: Lack of personal voice
-        personal_words = ['i think', 'i believe', 'in my opinion', 'personally']
-        if not any(word in content for word in personal_words):
+        if not any(phrase in content for phrase in _PERSONAL_PHRASES):
             ai_indicators += 1
         
         # Check 5: Generic transitions
-        generic_transitions = ['first', 'second', 'third', 'finally', 'in conclusion']
-        if sum(1 for word in generic_transitions if word in content) > 2:
+        transition_hits = len(_TRANSITION_WORDS & unique_words)
+        if 'in conclusion' in content:
+            transition_hits += 1
+        if transition_hits > 2:
             ai_indicators += 1
         
         ai_score = ai_indicators / total_checks
@@ -246,57 +577,69 @@ class SimpleAISystem:
         return 0.3
     
     def analyze_content(self, content: str) -> Dict:
-        """Analyze content quality"""
-        words = content.split()
-        sentences = re.split(r'[.!?]+', content)
+        """Analyze content quality
+        
+        Word, sentence, syllable, sentiment and complexity statistics all
+        come from one scan of the token stream instead of five separate
+        splits over the same string. Sentiment matching is per word
+        token, so lexicon words no longer match inside longer words.
+        """
+        word_count = 0
+        terminator_runs = 0
+        syllable_total = 0
+        complex_words = 0
+        pos_count = 0
+        neg_count = 0
+        unique_words = set()
+        
+        for match in _TOKEN_RE.finditer(content.lower()):
+            token = match.group()
+            if token[0] in '.!?':
+                terminator_runs += 1
+                continue
+            word_count += 1
+            if word_count <= 20:
+                syllable_total += _count_syllables(token)
+            if len(token) > 6:
+                complex_words += 1
+            unique_words.add(token)
+            if token in _POSITIVE_WORDS:
+                pos_count += 1
+            elif token in _NEGATIVE_WORDS:
+                neg_count += 1
         
         # Calculate readability (simplified Flesch score)
-        avg_words_per_sentence = len(words) / max(len(sentences), 1)
-        avg_syllables_per_word = sum(self.count_syllables(word) for word in words[:20]) / min(len(words), 20)
+        sentence_count = terminator_runs + 1
+        avg_words_per_sentence = word_count / sentence_count
+        avg_syllables_per_word = syllable_total / max(min(word_count, 20), 1)
         
         readability = 206.835 - (1.015 * avg_words_per_sentence) - (84.6 * avg_syllables_per_word)
         readability = max(0, min(100, readability))
         
-        # Sentiment analysis (simplified)
-        positive_words = ['good', 'great', 'excellent', 'positive', 'beneficial', 'effective']
-        negative_words = ['bad', 'poor', 'negative', 'harmful', 'ineffective', 'problem']
-        
-        pos_count = sum(1 for word in positive_words if word in content.lower())
-        neg_count = sum(1 for word in negative_words if word in content.lower())
-        
         sentiment = 'neutral'
         if pos_count > neg_count:
             sentiment = 'positive'
         elif neg_count > pos_count:
             sentiment = 'negative'
         
+        if word_count:
+            complexity = ((complex_words / word_count) * 0.6
+                          + (len(unique_words) / word_count) * 0.4) * 100
+        else:
+            complexity = 0
+        
         return {
-            'word_count': len(words),
-            'sentence_count': len(sentences),
+            'word_count': word_count,
+            'sentence_count': sentence_count,
             'readability_score': round(readability, 1),
             'sentiment': sentiment,
             'avg_words_per_sentence': round(avg_words_per_sentence, 1),
-            'complexity_score': self.calculate_complexity(content)
+            'complexity_score': round(complexity, 1)
         }
     
     def count_syllables(self, word: str) -> int:
         """Count syllables in a word (approximation)"""
-        word = word.lower()
-        vowels = 'aeiouy'
-        syllable_count = 0
-        prev_was_vowel = False
-        
-        for char in word:
-            is_vowel = char in vowels
-            if is_vowel and not prev_was_vowel:
-                syllable_count += 1
-            prev_was_vowel = is_vowel
-        
-        # Handle silent 'e'
-        if word.endswith('e') and syllable_count > 1:
-            syllable_count -= 1
-        
-        return max(1, syllable_count)
+        return _count_syllables(word.lower())
     
     def calculate_complexity(self, content: str) -> float:
         """Calculate content complexity"""
@@ -322,7 +665,7 @@ class SimpleAISystem:
         analysis = self.analyze_content(content)
         
         for criterion, weight in rubric.items():
-            score = self.evaluate_criterion(content, criterion, analysis)
+            score = _pick_handler(criterion.lower())(analysis)
             scores[criterion] = {
                 'score': score,
                 'weight': weight,
@@ -334,70 +677,7 @@ class SimpleAISystem:
     
     def evaluate_criterion(self, content: str, criterion: str, analysis: Dict) -> int:
         """Evaluate individual criterion"""
-        criterion_lower = criterion.lower()
-        
-        if 'content' in criterion_lower or 'quality' in criterion_lower:
-            # Content quality based on length, complexity, and structure
-            base_score = 70
-            
-            # Length scoring
-            word_count = analysis['word_count']
-            if word_count >= 200:
-                base_score += 15
-            elif word_count >= 100:
-                base_score += 10
-            elif word_count < 50:
-                base_score -= 20
-            
-            # Complexity scoring
-            complexity = analysis['complexity_score']
-            if complexity >= 70:
-                base_score += 10
-            elif complexity < 40:
-                base_score -= 10
-            
-            return min(100, max(0, base_score))
-        
-        elif 'grammar' in criterion_lower or 'writing' in criterion_lower:
-            # Grammar and writing quality
-            base_score = 75
-            
-            # Sentence structure
-            avg_sentences = analysis['avg_words_per_sentence']
-            if 10 <= avg_sentences <= 25:
-                base_score += 15
-            elif avg_sentences < 5:
-                base_score -= 15
-            
-            # Readability
-            readability = analysis['readability_score']
-            if readability >= 60:
-                base_score += 10
-            elif readability < 30:
-                base_score -= 10
-            
-            return min(100, max(0, base_score))
-        
-        elif 'creativity' in criterion_lower or 'original' in criterion_lower:
-            # Creativity and originality
-            base_score = 70
-            
-            # Uniqueness
-            complexity = analysis['complexity_score']
-            if complexity >= 60:
-                base_score += 20
-            elif complexity < 30:
-                base_score -= 15
-            
-            # Sentiment (creative writing often has emotional content)
-            if analysis['sentiment'] != 'neutral':
-                base_score += 10
-            
-            return min(100, max(0, base_score))
-        
-        else:
-            # Default scoring
-            return 75
+        return _pick_handler(criterion.lower())(analysis)
     
     def calculate_score(self, rubric_scores: Dict) -> int:
         """Calculate overall score"""
@@ -460,22 +740,32 @@ class SimpleAISystem:
         
         return " ".join(feedback_parts)
     
+    def _remember(self, content_hash: str, entry: Dict):
+        """Keep an entry in the in-process cache, evicting the oldest"""
+        self._mem_cache[content_hash] = entry
+        if len(self._mem_cache) > self._MEM_CACHE_MAX:
+            self._mem_cache.pop(next(iter(self._mem_cache)))
+    
     def get_cached_result(self, content: str) -> Optional[Dict]:
         """Get cached result"""
         try:
             content_hash = self.get_content_hash(content)
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
             
-            cursor.execute("SELECT * FROM submissions_cache WHERE content_hash = ?", (content_hash,))
-            result = cursor.fetchone()
-            conn.close()
+            entry = self._mem_cache.pop(content_hash, None)
+            if entry is not None:
+                # Re-insert so recently used entries outlive cold ones
+                self._mem_cache[content_hash] = entry
+                return entry
+            
+            result = self._conn.execute(self._SELECT_SQL, (content_hash,)).fetchone()
             
             if result:
-                return {
-                    'plagiarism': json.loads(result[1]) if result[1] else None,
-                    'grading': json.loads(result[3]) if result[3] else None
+                entry = {
+                    'plagiarism': json.loads(result[0]) if result[0] else None,
+                    'grading': json.loads(result[1]) if result[1] else None
                 }
+                self._remember(content_hash, entry)
+                return entry
             
             return None
             
@@ -487,23 +777,33 @@ class SimpleAISystem:
         """Cache results"""
         try:
             content_hash = self.get_content_hash(content)
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
             
             plagiarism_data = json.dumps(results.get('plagiarism')) if 'plagiarism' in results else None
             grading_data = json.dumps(results.get('grading')) if 'grading' in results else None
             
-            cursor.execute('''
-                INSERT OR REPLACE INTO submissions_cache 
-                (content_hash, similarity_scores, grade_result) 
-                VALUES (?, ?, ?)
-            ''', (content_hash, plagiarism_data, grading_data))
+            with self._write_lock:
+                self._conn.execute(self._UPSERT_SQL, (content_hash, plagiarism_data, grading_data))
             
-            conn.commit()
-            conn.close()
+            entry = self._mem_cache.pop(content_hash, None) or {'plagiarism': None, 'grading': None}
+            if 'plagiarism' in results:
+                entry['plagiarism'] = results.get('plagiarism')
+            if 'grading' in results:
+                entry['grading'] = results.get('grading')
+            self._remember(content_hash, entry)
             
         except Exception as e:
             logger.error(f"Cache write error: {e}")
 
-# Initialize the simple AI system
-simple_ai = SimpleAISystem()
+# The singleton is created on first attribute access rather than at
+# import - importing this module no longer opens the SQLite cache or
+# runs migrations, which matters for tools that only import types.
+# `from simple_ai_system import simple_ai` still works (PEP 562).
+_simple_ai = None
+
+def __getattr__(name):
+    if name == 'simple_ai':
+        global _simple_ai
+        if _simple_ai is None:
+            _simple_ai = SimpleAISystem()
+        return _simple_ai
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
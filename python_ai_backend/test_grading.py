@@ -1,8 +1,49 @@
 import requests
+from requests.adapters import HTTPAdapter, Retry
+import os
+import sys
+import gzip
 import json
+import orjson
+import hashlib
+from pathlib import Path
 
 API_URL = "http://127.0.0.1:8000/api/grade-submission"
 
+
+# One pooled session for the whole run - keep-alive skips the TCP
+# handshake on every request after the first, and transient gateway
+# errors retry with backoff instead of failing the test outright
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=64,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET", "POST"])
+    )
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+# Reruns of this script post the identical essay and rubric - with
+# USE_GRADE_CACHE=1 the result is replayed from disk instead of
+# re-grading. Off by default for non-deterministic grading setups.
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# The API inflates gzip request bodies; essays compress 4-6x
+_GZIP_JSON_HEADERS = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+
+GRADE_CACHE_DIR = Path(".grade_cache")
+_USE_GRADE_CACHE = os.getenv("USE_GRADE_CACHE") == "1"
+
+def _grade_cache_key(content, rubric):
+    """Stable key over the essay text and the canonical rubric"""
+    return (hashlib.sha256(content.encode()).hexdigest()[:16]
+            + hashlib.sha256(json.dumps(rubric, sort_keys=True).encode()).hexdigest()[:16])
+
 TEST_ESSAY = """
 Climate change represents one of the most significant challenges facing humanity today. 
 The scientific consensus is clear: human activities, particularly the burning of fossil fuels, 
@@ -22,6 +63,9 @@ By transitioning to clean energy, protecting natural habitats, and promoting sus
 we can work towards a more sustainable future for generations to come.
 """
 
+# Computed once - the word count never changes between runs
+TEST_ESSAY_WORDS = len(TEST_ESSAY.split())
+
 def test_grading():
     print("=" * 60)
     print("TESTING AI GRADING SYSTEM")
@@ -50,54 +94,76 @@ def test_grading():
     }
     
     print("\nSending grading request...")
-    print(f"Essay length: {len(TEST_ESSAY.split())} words")
+    print(f"Essay length: {TEST_ESSAY_WORDS} words")
     
     try:
-        response = requests.post(API_URL, json=request_data)
+        result = None
+        cache_path = None
+        if _USE_GRADE_CACHE:
+            cache_path = GRADE_CACHE_DIR / f"{_grade_cache_key(TEST_ESSAY, request_data['rubric'])}.json"
+            if cache_path.exists():
+                result = json.loads(cache_path.read_text())
+                print("(replaying cached grading result)")
         
-        if response.status_code == 200:
-            result = response.json()
-            
-            print("\n" + "=" * 60)
-            print("GRADING RESULTS")
-            print("=" * 60)
-            
-            print(f"\nOverall Score: {result['total_score']}%")
-            print(f"Confidence: {result['confidence'] * 100}%")
-            
-            print("\n--- Criteria Scores ---")
-            for criterion, scores in result['criteria_scores'].items():
-                print(f"\n{criterion.upper()}:")
-                print(f"  Score: {scores['score']}/{scores['max_score']} ({scores.get('percentage', 0)}%)")
-                print(f"  Feedback: {scores['feedback']}")
-            
-            print("\n--- Strengths ---")
-            for strength in result['strengths']:
-                print(f"  ✓ {strength}")
-            
-            print("\n--- Areas for Improvement ---")
-            for improvement in result['improvements']:
-                print(f"  → {improvement}")
-            
-            print("\n--- Plagiarism Check ---")
-            plag = result['plagiarism_result']
-            print(f"  Similarity Score: {plag['similarity_score']}%")
-            print(f"  Status: {'⚠ SUSPICIOUS' if plag['is_suspicious'] else '✓ CLEAR'}")
-            
-            if plag['suspicious_segments']:
-                print(f"  Flagged Segments: {len(plag['suspicious_segments'])}")
+        if result is None:
+            response = SESSION.post(API_URL,
+                                    data=gzip.compress(orjson.dumps(request_data), compresslevel=1),
+                                    headers=_GZIP_JSON_HEADERS, timeout=(1.0, 10.0))
             
-            print("\n--- Full Feedback ---")
-            print(result['feedback'])
-            
-            print("\n" + "=" * 60)
-            print("TEST COMPLETED SUCCESSFULLY!")
-            print("=" * 60)
-            
-        else:
-            print(f"\n❌ Error: {response.status_code}")
-            print(response.text)
+            if response.status_code != 200:
+                print(f"\n❌ Error: {response.status_code}")
+                print(response.text)
+                return
             
+            result = orjson.loads(response.content)
+            if cache_path is not None:
+                GRADE_CACHE_DIR.mkdir(exist_ok=True)
+                cache_path.write_text(json.dumps(result))
+        
+        # The result formatting fans out into dozens of print calls, each
+        # its own write() syscall; collect the lines and flush once
+        buf = []
+        def w(line=""):
+            buf.append(f"{line}\n")
+        
+        w("\n" + "=" * 60)
+        w("GRADING RESULTS")
+        w("=" * 60)
+        
+        w(f"\nOverall Score: {result['total_score']}%")
+        w(f"Confidence: {result['confidence'] * 100}%")
+        
+        w("\n--- Criteria Scores ---")
+        for criterion, scores in result['criteria_scores'].items():
+            w(f"\n{criterion.upper()}:")
+            w(f"  Score: {scores['score']}/{scores['max_score']} ({scores.get('percentage', 0)}%)")
+            w(f"  Feedback: {scores['feedback']}")
+        
+        w("\n--- Strengths ---")
+        for strength in result['strengths']:
+            w(f"  ✓ {strength}")
+        
+        w("\n--- Areas for Improvement ---")
+        for improvement in result['improvements']:
+            w(f"  → {improvement}")
+        
+        w("\n--- Plagiarism Check ---")
+        plag = result['plagiarism_result']
+        w(f"  Similarity Score: {plag['similarity_score']}%")
+        w(f"  Status: {'⚠ SUSPICIOUS' if plag['is_suspicious'] else '✓ CLEAR'}")
+        
+        if plag['suspicious_segments']:
+            w(f"  Flagged Segments: {len(plag['suspicious_segments'])}")
+        
+        w("\n--- Full Feedback ---")
+        w(result['feedback'])
+        
+        w("\n" + "=" * 60)
+        w("TEST COMPLETED SUCCESSFULLY!")
+        w("=" * 60)
+        
+        sys.stdout.write("".join(buf))
+        
     except requests.exceptions.ConnectionError:
         print("\n❌ ERROR: Cannot connect to API")
         print("Make sure the backend is running:")
@@ -109,7 +175,7 @@ def test_health_check():
     """Test if API is running"""
     print("\nTesting API health check...")
     try:
-        response = requests.get("http://127.0.0.1:8000/health")
+        response = SESSION.get("http://127.0.0.1:8000/health", timeout=(1.0, 10.0))
         if response.status_code == 200:
             print("✓ API is running!")
             return True
@@ -6,13 +6,55 @@ This example shows how to integrate the grading API with webhooks
 for real-time grading in learning management systems.
 """
 
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, HTTPException, BackgroundTasks
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import requests
+from requests.adapters import HTTPAdapter
+import os
+import copy
+import gzip
 import json
+import orjson
 import asyncio
+import hashlib
+from pathlib import Path
+from functools import lru_cache
 from typing import Dict, Any
 
+# Content-addressed cache of grading results - an LMS retrying a
+# webhook re-sends the identical submission, and a disk read is
+# orders of magnitude cheaper than re-grading. Opt-in via
+# USE_GRADE_CACHE=1 so non-deterministic grading setups can skip it.
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# The grading API inflates gzip request bodies; LMS callbacks stay
+# uncompressed since external endpoints may not accept gzip requests
+_GZIP_JSON_HEADERS = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+
+GRADE_CACHE_DIR = Path(".grade_cache")
+_USE_GRADE_CACHE = os.getenv("USE_GRADE_CACHE") == "1"
+
+def _grade_cache_key(content: str, rubric: Dict[str, Any]) -> str:
+    """Stable key over the submission text and the canonical rubric"""
+    return (hashlib.sha256(content.encode()).hexdigest()[:16]
+            + hashlib.sha256(json.dumps(rubric, sort_keys=True).encode()).hexdigest()[:16])
+
+def _build_session() -> requests.Session:
+    """One pooled session for grading calls and LMS callbacks
+    
+    Bare requests.post opens and tears down a TCP (and TLS) connection
+    per call; a session with a sized adapter keeps connections alive so
+    every request after the first skips the handshake.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+_session = _build_session()
+
 # Your grading API client
 class GradingAPIClient:
     def __init__(self, base_url: str = "http://localhost:8000"):
@@ -29,15 +71,27 @@ class GradingAPIClient:
             "assignment_type": "essay"
         }
         
-        # Use asyncio to make the request non-blocking
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None, 
-            lambda: requests.post(f"{self.base_url}/api/grade-submission", json=payload)
+        cache_path = None
+        if _USE_GRADE_CACHE:
+            cache_path = GRADE_CACHE_DIR / f"{_grade_cache_key(content, rubric)}.json"
+            if cache_path.exists():
+                return json.loads(cache_path.read_text())
+        
+        # Runs in a worker thread so the event loop keeps serving other
+        # webhooks; the shared session reuses its pooled connection
+        response = await asyncio.to_thread(
+            _session.post, f"{self.base_url}/api/grade-submission",
+            data=gzip.compress(orjson.dumps(payload), compresslevel=1),
+            headers=_GZIP_JSON_HEADERS,
+            timeout=(1.0, 30.0)
         )
         
         if response.status_code == 200:
-            return response.json()
+            result = response.json()
+            if cache_path is not None:
+                GRADE_CACHE_DIR.mkdir(exist_ok=True)
+                cache_path.write_text(json.dumps(result))
+            return result
         else:
             raise HTTPException(status_code=response.status_code, detail=response.text)
 
@@ -45,6 +99,31 @@ class GradingAPIClient:
 webhook_app = FastAPI(title="Grading Webhook Receiver")
 grading_client = GradingAPIClient()
 
+@webhook_app.on_event("shutdown")
+async def close_session():
+    """Release the pooled connections on shutdown"""
+    _session.close()
+
+async def _send_callback(callback_url: str, payload: Dict[str, Any]):
+    """Post a result back to the LMS without blocking the event loop
+    
+    Scheduled with asyncio.create_task so the webhook response to the
+    LMS is not gated on the callback round-trip; failures are logged
+    and swallowed as before.
+    """
+    try:
+        # Bounded twice over: a connect/read timeout on the request and
+        # a hard five-second ceiling on the whole attempt, so a dead
+        # LMS can never pin a worker thread indefinitely
+        await asyncio.wait_for(
+            asyncio.to_thread(_session.post, callback_url,
+                              data=orjson.dumps(payload), headers=_JSON_HEADERS,
+                              timeout=(1.0, 5.0)),
+            timeout=5.0
+        )
+    except Exception as e:
+        print(f"Failed to send callback: {e}")
+
 class SubmissionWebhook(BaseModel):
     """Webhook payload from your LMS"""
     submission_id: str
@@ -54,91 +133,179 @@ class SubmissionWebhook(BaseModel):
     rubric: Dict[str, Any]
     callback_url: str  # Where to send results back
 
-@webhook_app.post("/webhook/submission")
-async def handle_submission_webhook(submission: SubmissionWebhook):
-    """
-    Handle incoming submission webhooks from your LMS
+# Accepted submissions are spooled to disk before the 202 goes out.
+# BackgroundTasks alone is in-process - a crash or restart between
+# accept and callback would lose the submission silently. Each spool
+# file is removed once its callback has been delivered, and leftovers
+# are re-queued when the receiver starts.
+_SPOOL_DIR = Path("webhook_spool")
+
+def _spool_submission(submission: "SubmissionWebhook") -> Path:
+    """Persist an accepted submission until its callback is delivered"""
+    _SPOOL_DIR.mkdir(exist_ok=True)
+    path = _SPOOL_DIR / f"{submission.submission_id}.json"
+    path.write_bytes(orjson.dumps(submission.dict()))
+    return path
+
+async def _grade_and_callback(submission: SubmissionWebhook, spool_path: Path = None):
+    """Grade a submission and deliver the result to the LMS
+    
+    Runs as a background task after the webhook has already been
+    acknowledged, so the LMS never waits on grading or the callback.
+    The grading call and the result callback live in one TaskGroup
+    (Python 3.11+): cancellation - say the server shutting down - tears
+    both down together instead of leaking an in-flight request, and in
+    that case the spool entry survives for recovery on restart.
     """
     try:
-        # Grade the submission
-        result = await grading_client.grade_submission(
-            content=submission.content,
-            student_id=submission.student_id,
-            assignment_id=submission.assignment_id,
-            rubric=submission.rubric
-        )
-        
-        # Send results back to your LMS
-        callback_payload = {
-            "submission_id": submission.submission_id,
-            "grading_result": result,
-            "status": "completed"
-        }
-        
-        # Send callback (in real implementation, use proper async HTTP client)
-        try:
-            requests.post(submission.callback_url, json=callback_payload)
-        except Exception as e:
-            print(f"Failed to send callback: {e}")
+        async with asyncio.TaskGroup() as tg:
+            # Grade the submission
+            result = await tg.create_task(grading_client.grade_submission(
+                content=submission.content,
+                student_id=submission.student_id,
+                assignment_id=submission.assignment_id,
+                rubric=submission.rubric
+            ))
+            
+            # Send results back to your LMS
+            callback_payload = {
+                "submission_id": submission.submission_id,
+                "grading_result": result,
+                "status": "completed"
+            }
+            
+            tg.create_task(_send_callback(submission.callback_url, callback_payload))
         
-        return {
-            "status": "success",
-            "submission_id": submission.submission_id,
-            "score": result["total_score"]
-        }
-        
-    except Exception as e:
-        # Send error callback
+    except* Exception as eg:
+        # Send error callback with every aggregated failure
         error_payload = {
             "submission_id": submission.submission_id,
             "status": "error",
-            "error": str(e)
+            "error": "; ".join(str(e) for e in eg.exceptions)
         }
         
+        await _send_callback(submission.callback_url, error_payload)
+    
+    # Reached only when the submission was fully processed (including
+    # the error callback) - a cancelled task keeps its spool entry
+    if spool_path is not None:
+        spool_path.unlink(missing_ok=True)
+
+@webhook_app.on_event("startup")
+async def recover_spooled_submissions():
+    """Re-queue submissions that were accepted but never completed"""
+    if not _SPOOL_DIR.exists():
+        return
+    for path in _SPOOL_DIR.glob("*.json"):
         try:
-            requests.post(submission.callback_url, json=error_payload)
-        except:
-            pass
-        
-        raise HTTPException(status_code=500, detail=str(e))
+            submission = SubmissionWebhook(**orjson.loads(path.read_bytes()))
+        except Exception as e:
+            print(f"Dropping unreadable spool entry {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            continue
+        asyncio.create_task(_grade_and_callback(submission, path))
+
+@webhook_app.post("/webhook/submission")
+async def handle_submission_webhook(submission: SubmissionWebhook, background_tasks: BackgroundTasks):
+    """
+    Handle incoming submission webhooks from your LMS
+    
+    The webhook is acknowledged with 202 as soon as the payload has
+    validated; grading and the result callback happen in a background
+    task, so the LMS pays one round-trip instead of grade_time plus
+    callback_time.
+    """
+    spool_path = _spool_submission(submission)
+    background_tasks.add_task(_grade_and_callback, submission, spool_path)
+    
+    return JSONResponse(
+        {"status": "queued", "submission_id": submission.submission_id},
+        status_code=202
+    )
 
 # Example LMS integration (Canvas, Blackboard, etc.)
 class LMSIntegration:
-    """Example integration with popular LMS platforms"""
+    """Example integration with popular LMS platforms
+    
+    LMS platforms retry webhooks for the same submission, so the
+    conversion helpers are memoized on the identifying fields - a
+    retry costs a cache lookup plus one deep copy instead of
+    rebuilding the rubric and callback URL. Submissions that carry
+    their own rubric (an unhashable dict) bypass the cache.
+    """
+    
+    # Default rubric applied when the LMS payload does not carry one
+    _DEFAULT_RUBRIC = {
+        "content": {"max_points": 30, "min_words": 100},
+        "structure": {"max_points": 25},
+        "grammar": {"max_points": 20},
+        "argument": {"max_points": 25}
+    }
+    
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _canvas_payload(submission_id, user_id, assignment_id, course_id, body) -> Dict[str, Any]:
+        return {
+            "submission_id": submission_id,
+            "student_id": user_id,
+            "assignment_id": assignment_id,
+            "content": body,
+            "rubric": LMSIntegration._DEFAULT_RUBRIC,
+            "callback_url": f"https://your-canvas-instance.com/api/v1/courses/{course_id}/assignments/{assignment_id}/submissions/{submission_id}/grade"
+        }
     
     @staticmethod
     def canvas_webhook_payload(submission_data: Dict[str, Any]) -> Dict[str, Any]:
         """Convert Canvas submission to our format"""
+        if "rubric" in submission_data:
+            return {
+                "submission_id": submission_data["id"],
+                "student_id": submission_data["user_id"],
+                "assignment_id": submission_data["assignment_id"],
+                "content": submission_data["body"],
+                "rubric": submission_data["rubric"],
+                "callback_url": f"https://your-canvas-instance.com/api/v1/courses/{submission_data['course_id']}/assignments/{submission_data['assignment_id']}/submissions/{submission_data['id']}/grade"
+            }
+        # Deep copy so a caller mutating the payload's rubric cannot
+        # reach through to _DEFAULT_RUBRIC or other cached payloads
+        return copy.deepcopy(LMSIntegration._canvas_payload(
+            submission_data["id"],
+            submission_data["user_id"],
+            submission_data["assignment_id"],
+            submission_data["course_id"],
+            submission_data["body"]
+        ))
+    
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _moodle_payload(submission_id, user_id, assignment_id, body) -> Dict[str, Any]:
         return {
-            "submission_id": submission_data["id"],
-            "student_id": submission_data["user_id"],
-            "assignment_id": submission_data["assignment_id"],
-            "content": submission_data["body"],
-            "rubric": submission_data.get("rubric", {
-                "content": {"max_points": 30, "min_words": 100},
-                "structure": {"max_points": 25},
-                "grammar": {"max_points": 20},
-                "argument": {"max_points": 25}
-            }),
-            "callback_url": f"https://your-canvas-instance.com/api/v1/courses/{submission_data['course_id']}/assignments/{submission_data['assignment_id']}/submissions/{submission_data['id']}/grade"
+            "submission_id": submission_id,
+            "student_id": user_id,
+            "assignment_id": assignment_id,
+            "content": body,
+            "rubric": LMSIntegration._DEFAULT_RUBRIC,
+            "callback_url": f"https://your-moodle-site.com/mod/assign/view.php?id={assignment_id}"
         }
     
     @staticmethod
     def moodle_webhook_payload(submission_data: Dict[str, Any]) -> Dict[str, Any]:
         """Convert Moodle submission to our format"""
-        return {
-            "submission_id": submission_data["id"],
-            "student_id": submission_data["userid"],
-            "assignment_id": submission_data["assignment"],
-            "content": submission_data["onlinetext"],
-            "rubric": submission_data.get("rubric", {
-                "content": {"max_points": 30, "min_words": 100},
-                "structure": {"max_points": 25},
-                "grammar": {"max_points": 20},
-                "argument": {"max_points": 25}
-            }),
-            "callback_url": f"https://your-moodle-site.com/mod/assign/view.php?id={submission_data['assignment']}"
-        }
+        if "rubric" in submission_data:
+            return {
+                "submission_id": submission_data["id"],
+                "student_id": submission_data["userid"],
+                "assignment_id": submission_data["assignment"],
+                "content": submission_data["onlinetext"],
+                "rubric": submission_data["rubric"],
+                "callback_url": f"https://your-moodle-site.com/mod/assign/view.php?id={submission_data['assignment']}"
+            }
+        return copy.deepcopy(LMSIntegration._moodle_payload(
+            submission_data["id"],
+            submission_data["userid"],
+            submission_data["assignment"],
+            submission_data["onlinetext"]
+        ))
 
 # Example usage
 if __name__ == "__main__":